@@ -0,0 +1,238 @@
+import heapq
+import itertools
+import json
+import math
+from Controller import _get_effects_mask
+from DataHandler import DataHandler
+from LRUCache import LRUCache
+from Profiling import profiled
+
+_acquisition_graphs_list = []
+_plans_cache = LRUCache(max_size=1024)
+
+
+def _clear_caches():
+    _acquisition_graphs_list.clear()
+    _plans_cache.clear()
+
+
+DataHandler.add_reload_listener(_clear_caches)
+
+
+class Source:
+    """Place where an ingredient is bought (vendor is set) or gathered, gold is the price and time is the time spent
+    there per piece"""
+    __slots__ = ("location_id", "vendor", "gold", "time")
+
+    def __init__(self, location_id: int, vendor, gold: float, time: float):
+        self.location_id = location_id
+        self.vendor = vendor
+        self.gold = gold
+        self.time = time
+
+
+class AcquisitionStep:
+    __slots__ = ("ingredient", "location", "vendor", "gold")
+
+    def __init__(self, ingredient, location, vendor, gold):
+        self.ingredient = ingredient
+        self.location = location
+        self.vendor = vendor
+        self.gold = gold
+
+    def __repr__(self):
+        return f"AcquisitionStep({self.ingredient!r}, {self.location!r}, {self.vendor!r}, {self.gold!r})"
+
+
+class AcquisitionPlan:
+    """Recipe with the cheapest way to get its ingredients: steps in visiting order (owned ingredients are not
+    listed), total gold, travel and gathering time, and cost = gold + time_cost * time"""
+    __slots__ = ("ingredients", "effects", "steps", "gold", "time", "cost")
+
+    def __init__(self, ingredients: tuple, effects: set, steps: tuple, gold: float, time: float, cost: float):
+        self.ingredients = ingredients
+        self.effects = effects
+        self.steps = steps
+        self.gold = gold
+        self.time = time
+        self.cost = cost
+
+    def __repr__(self):
+        return f"AcquisitionPlan({self.ingredients!r}, cost={self.cost!r}, steps={self.steps!r})"
+
+
+class AcquisitionGraph:
+    """Locations connected by routes weighted with travel time, with vendors and gathering spots as ingredient
+    sources. Shortest travel times from a location are computed with Dijkstra on first use and kept."""
+
+    def __init__(self, acquisition_dict: dict):
+        self.start_location = acquisition_dict.get("start_location")
+        location_names = {self.start_location} if self.start_location else set()
+        for route in acquisition_dict.get("routes", []):
+            location_names.update((route["from"], route["to"]))
+        location_names.update(vendor["location"] for vendor in acquisition_dict.get("vendors", []))
+        location_names.update(location["name"] for location in acquisition_dict.get("locations", []))
+        self.locations_list: tuple = tuple(sorted(location_names))
+        self.location_ids_dict: dict = {name: i for i, name in enumerate(self.locations_list)}
+
+        self.neighbours_list: list = [[] for _ in self.locations_list]
+        for route in acquisition_dict.get("routes", []):
+            location_id1 = self.location_ids_dict[route["from"]]
+            location_id2 = self.location_ids_dict[route["to"]]
+            self.neighbours_list[location_id1].append((location_id2, route["time"]))
+            if not route.get("one_way", False):
+                self.neighbours_list[location_id2].append((location_id1, route["time"]))
+
+        self.ingredient_sources_dict: dict = {}
+        for vendor in acquisition_dict.get("vendors", []):
+            location_id = self.location_ids_dict[vendor["location"]]
+            for ingredient, gold in vendor.get("prices", {}).items():
+                self.ingredient_sources_dict.setdefault(ingredient, []).append(
+                    Source(location_id, vendor["name"], gold, vendor.get("time", 0)))
+        for location in acquisition_dict.get("locations", []):
+            location_id = self.location_ids_dict[location["name"]]
+            for ingredient, time in location.get("ingredients", {}).items():
+                self.ingredient_sources_dict.setdefault(ingredient, []).append(Source(location_id, None, 0, time))
+        self._travel_times_dict: dict = {}
+
+    @classmethod
+    def from_file(cls, file_path):
+        with open(file_path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def get_travel_times(self, location_id) -> list:
+        """Returns list of shortest travel times from location to every location, inf for unreachable ones"""
+        travel_times = self._travel_times_dict.get(location_id)
+        if travel_times is not None:
+            return travel_times
+        travel_times = [math.inf] * len(self.locations_list)
+        travel_times[location_id] = 0
+        heap = [(0, location_id)]
+        while heap:
+            travel_time, current_id = heapq.heappop(heap)
+            if travel_time > travel_times[current_id]:
+                continue
+            for neighbour_id, route_time in self.neighbours_list[current_id]:
+                if travel_time + route_time < travel_times[neighbour_id]:
+                    travel_times[neighbour_id] = travel_time + route_time
+                    heapq.heappush(heap, (travel_time + route_time, neighbour_id))
+        self._travel_times_dict[location_id] = travel_times
+        return travel_times
+
+
+def get_acquisition_graph() -> AcquisitionGraph:
+    """Returns graph read from data/acquisition.json, kept until data is reloaded"""
+    if not _acquisition_graphs_list:
+        _acquisition_graphs_list.append(AcquisitionGraph.from_file(DataHandler.get_acquisition_file_path()))
+    return _acquisition_graphs_list[0]
+
+
+@profiled
+def find_cheapest_recipe(required_effects, forbidden_effects=(), forbid_negative_effects=False,
+                         owned_ingredients=(), start_location=None, time_cost=1.0,
+                         max_ingredients_count=3) -> AcquisitionPlan:
+    """Returns AcquisitionPlan of the recipe with all required effects and none of forbidden effects which is the
+    cheapest to get, or None if no such recipe can be made. Owned ingredients cost nothing, others are bought or
+    gathered on a route starting at start_location (start of the graph if None). time_cost is the gold one unit of
+    time is worth: 0 finds the cheapest recipe, a high value the fastest one. Results are cached per query.
+
+    Recipes are evaluated best-first by a lower bound of their cost (cheapest price of every ingredient plus travel
+    to the farthest of their nearest sources), and the search stops when the bound reaches the best exact cost
+    found."""
+    key = (frozenset(required_effects), frozenset(forbidden_effects), forbid_negative_effects,
+           frozenset(owned_ingredients), start_location, time_cost, max_ingredients_count)
+    return _plans_cache.get_or_compute(key, lambda: _find_cheapest_recipe(*key))
+
+
+def _find_cheapest_recipe(required_effects, forbidden_effects, forbid_negative_effects, owned_ingredients,
+                          start_location, time_cost, max_ingredients_count):
+    effect_index = DataHandler().snapshot.effect_index
+    graph = get_acquisition_graph()
+    if any(effect not in effect_index.effect_ids_dict for effect in required_effects):
+        return None
+    required_mask = _get_effects_mask(effect_index, required_effects)
+    forbidden_mask = _get_effects_mask(effect_index, forbidden_effects)
+    if forbid_negative_effects:
+        forbidden_mask |= effect_index.negative_effects_mask & ~required_mask
+    start_location = start_location or graph.start_location
+    start_location_id = graph.location_ids_dict.get(start_location)
+    if start_location_id is None:
+        raise ValueError(f"Unknown start location {start_location}.")
+    start_travel_times = graph.get_travel_times(start_location_id)
+
+    # None stands for an owned ingredient, it needs no travel
+    sources_dict = {}
+    gold_bounds = [0] * len(effect_index.ingredients_list)
+    travel_bounds = [0] * len(effect_index.ingredients_list)
+    for ingredient in effect_index.ingredients:
+        if ingredient.name in owned_ingredients:
+            sources_dict[ingredient.id] = [None]
+            continue
+        sources = [source for source in graph.ingredient_sources_dict.get(ingredient.name, ())
+                   if start_travel_times[source.location_id] < math.inf]
+        if sources:
+            sources_dict[ingredient.id] = sources
+            gold_bounds[ingredient.id] = min(source.gold + time_cost * source.time for source in sources)
+            travel_bounds[ingredient.id] = min(time_cost * start_travel_times[source.location_id]
+                                               for source in sources)
+
+    best_plan = None
+    # pairs first: the best pair bounds the cost, so triples only use ingredients which are cheaper on their own
+    for ingredients_count in range(2, max_ingredients_count + 1):
+        available_mask = 0
+        for ingredient_id in sources_dict:
+            if best_plan is None or gold_bounds[ingredient_id] + travel_bounds[ingredient_id] < best_plan.cost:
+                available_mask |= 1 << ingredient_id
+        candidates = []
+        for ingredient_ids, effects_mask in effect_index.iter_recipes_having(required_mask, available_mask,
+                                                                             ingredients_count):
+            if len(ingredient_ids) == ingredients_count and not effects_mask & forbidden_mask:
+                lower_bound = sum(gold_bounds[i] for i in ingredient_ids) + max(travel_bounds[i]
+                                                                                 for i in ingredient_ids)
+                candidates.append((lower_bound, ingredient_ids, effects_mask))
+        candidates.sort(key=lambda candidate: candidate[0])
+
+        for lower_bound, ingredient_ids, effects_mask in candidates:
+            if best_plan is not None and lower_bound >= best_plan.cost:
+                break
+            plan = _get_route(graph, effect_index, start_location_id, ingredient_ids, effects_mask, sources_dict,
+                              time_cost)
+            if best_plan is None or plan.cost < best_plan.cost:
+                best_plan = plan
+    return best_plan
+
+
+def _get_route(graph, effect_index, start_location_id, ingredient_ids, effects_mask, sources_dict, time_cost):
+    """Returns the cheapest AcquisitionPlan of a recipe, trying every order of ingredients and choosing a source of
+    every ingredient by dynamic programming over locations"""
+    best_state = None
+    for ordered_ids in itertools.permutations(ingredient_ids):
+        # location id -> (cost, gold, time, steps) of the cheapest way to stand there with previous ingredients
+        states_dict = {start_location_id: (0, 0, 0, ())}
+        for ingredient_id in ordered_ids:
+            ingredient = effect_index.ingredients_list[ingredient_id]
+            next_states_dict = {}
+            for source in sources_dict[ingredient_id]:
+                if source is None:
+                    next_states_dict = states_dict
+                    break
+                for location_id, (cost, gold, time, steps) in states_dict.items():
+                    spent_time = graph.get_travel_times(location_id)[source.location_id] + source.time
+                    next_cost = cost + source.gold + time_cost * spent_time
+                    previous_state = next_states_dict.get(source.location_id)
+                    if previous_state is None or next_cost < previous_state[0]:
+                        step = AcquisitionStep(ingredient, graph.locations_list[source.location_id], source.vendor,
+                                               source.gold)
+                        next_states_dict[source.location_id] = (next_cost, gold + source.gold, time + spent_time,
+                                                                steps + (step,))
+            states_dict = next_states_dict
+        state = min(states_dict.values(), key=lambda state: state[0])
+        if best_state is None or state[0] < best_state[0]:
+            best_state = state
+    cost, gold, time, steps = best_state
+    return AcquisitionPlan(tuple(effect_index.ingredients_list[i] for i in ingredient_ids),
+                           effect_index.mask_to_effects(effects_mask), steps, gold, time, cost)
+
+
+if __name__ == '__main__':
+    print(find_cheapest_recipe({"Restore Health"}, forbid_negative_effects=True))
@@ -0,0 +1,221 @@
+"""Runs recipe queries over many inventories without the GUI. Inventories are read from a file or stdin, one result
+per inventory is written as a JSON line in input order:
+
+    python BatchQueries.py recipes inventories.jsonl --workers 4 > results.jsonl
+    python BatchQueries.py plan inventories.csv --objective value
+    python BatchQueries.py effects inventories.jsonl --required "Restore Health" --forbid-negative-effects
+
+JSONL input has one inventory per line: {"id": "player1", "ingredients": {"Wheat": 3, "Blue Mountain Flower": 1}}
+("ingredients" may also be a list of names, each counted once). CSV input has columns id,ingredient,count with rows
+of one inventory next to each other. An inventory which cannot be read, or whose query fails, gets a record
+{"id": ..., "error": ...} and the run goes on; the exit code is then 1.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+from collections import deque
+
+import Controller
+import Optimizer
+from DataHandler import DataHandler
+
+QUERY_RECIPES = "recipes"
+QUERY_PLAN = "plan"
+QUERY_EFFECTS = "effects"
+
+
+def _parse_count(value, line_number) -> int:
+    try:
+        count = int(value)
+    except (ValueError, TypeError) as exception:
+        raise ValueError(f"Invalid count on line {line_number}: {exception}") from exception
+    if count < 0:
+        raise ValueError(f"Invalid count on line {line_number}: {count} is negative")
+    return count
+
+
+def iter_jsonl_inventories(lines):
+    """Yields (inventory id, dict ingredient -> count) from JSON lines, blank lines are skipped. An inventory which
+    cannot be read is yielded with ValueError instead of the dict (and line number as id if it has none), so it gets
+    an error record and the other inventories are still answered."""
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            inventory_id = item.get("id", line_number)
+            ingredients = item["ingredients"]
+        except (ValueError, KeyError, TypeError, AttributeError) as exception:
+            yield line_number, ValueError(f"Invalid inventory on line {line_number}: {exception}")
+            continue
+        try:
+            if isinstance(ingredients, dict):
+                owned_ingredients_dict = {ingredient: _parse_count(count, line_number)
+                                          for ingredient, count in ingredients.items()}
+            else:
+                owned_ingredients_dict = dict.fromkeys(ingredients, 1)
+        except ValueError as exception:
+            yield inventory_id, exception
+        except TypeError as exception:
+            yield inventory_id, ValueError(f"Invalid inventory on line {line_number}: {exception}")
+        else:
+            yield inventory_id, owned_ingredients_dict
+
+
+def iter_csv_inventories(lines):
+    """Yields (inventory id, dict ingredient -> count) from CSV rows id,ingredient,count grouped by id. An inventory
+    with an invalid count is yielded with ValueError instead of the dict."""
+    reader = csv.reader(lines)
+    numbered_rows = ((reader.line_num, row) for row in reader if row and row[0] != "id")
+    for inventory_id, inventory_rows in itertools.groupby(numbered_rows, key=lambda numbered_row: numbered_row[1][0]):
+        owned_ingredients_dict = {}
+        try:
+            for line_number, row in inventory_rows:
+                if len(row) < 2:
+                    raise ValueError(f"Invalid inventory on line {line_number}: missing ingredient")
+                count = _parse_count(row[2], line_number) if len(row) > 2 and row[2] else 1
+                owned_ingredients_dict[row[1]] = owned_ingredients_dict.get(row[1], 0) + count
+        except ValueError as exception:
+            for _ in inventory_rows:
+                pass
+            yield inventory_id, exception
+        else:
+            yield inventory_id, owned_ingredients_dict
+
+
+def run_query(query, inventory_id, owned_ingredients_dict, options: dict) -> dict:
+    """Returns JSON serializable result of query for one inventory"""
+    available_ingredients = {ingredient for ingredient, count in owned_ingredients_dict.items() if count > 0}
+    max_ingredients_count = options["max_ingredients_count"]
+    if query == QUERY_RECIPES:
+        recipes = itertools.islice(
+            Controller.iter_possible_recipes(available_ingredients, max_ingredients_count), options["limit"])
+    elif query == QUERY_EFFECTS:
+        recipes = itertools.islice(Controller.iter_recipes_for_effects(
+            options["required"], options["optional"], options["forbidden"], options["forbid_negative_effects"],
+            available_ingredients, max_ingredients_count), options["limit"])
+    elif query == QUERY_PLAN:
+        brews = Optimizer.plan_brews(owned_ingredients_dict, options["objective"],
+                                     max_ingredients_count=max_ingredients_count)
+        return {"id": inventory_id, "potions_count": sum(times for _, times in brews),
+                "brews": [{"ingredients": list(ingredients), "times": times} for ingredients, times in brews]}
+    else:
+        raise ValueError(f"Unknown query {query}.")
+    return {"id": inventory_id, "recipes": [{"ingredients": list(ingredients), "effects": sorted(effects)}
+                                            for ingredients, effects in recipes]}
+
+
+def _run_query_safely(query, inventory_id, owned_ingredients_dict, options) -> dict:
+    try:
+        return run_query(query, inventory_id, owned_ingredients_dict, options)
+    except Exception as exception:
+        return {"id": inventory_id, "error": str(exception)}
+
+
+def _init_worker(data_folder_path):
+    """Loads data of a worker process; a forked worker already has the data of the parent and this does nothing"""
+    if DataHandler._data_folder_path != data_folder_path:
+        DataHandler.set_data_folder_path(data_folder_path)
+    DataHandler()
+
+
+def iter_results(query, inventories, options: dict, workers=1):
+    """Yields result of query for every (inventory id, owned ingredients dict) of inventories, in input order. An
+    inventory given with an exception instead of the dict gets an error record. Data is loaded once before workers
+    start. With workers > 1 inventories are processed in a process pool with a bounded number of inventories in
+    flight, so input is read as results are written."""
+    DataHandler()
+    if workers <= 1:
+        for inventory_id, owned_ingredients_dict in inventories:
+            if isinstance(owned_ingredients_dict, Exception):
+                yield {"id": inventory_id, "error": str(owned_ingredients_dict)}
+            else:
+                yield _run_query_safely(query, inventory_id, owned_ingredients_dict, options)
+        return
+
+    # multiprocessing is imported only for parallel runs
+    from concurrent.futures import Future, ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(DataHandler._data_folder_path,)) as executor:
+        futures = deque()
+        for inventory_id, owned_ingredients_dict in inventories:
+            if isinstance(owned_ingredients_dict, Exception):
+                # the error record keeps its place in output order
+                future = Future()
+                future.set_result({"id": inventory_id, "error": str(owned_ingredients_dict)})
+            else:
+                future = executor.submit(_run_query_safely, query, inventory_id, owned_ingredients_dict, options)
+            futures.append(future)
+            if len(futures) >= workers * 4:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+
+
+def _create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Runs recipe queries over many inventories without the GUI.")
+    parser.add_argument("query", choices=[QUERY_RECIPES, QUERY_PLAN, QUERY_EFFECTS],
+                        help="recipes of owned ingredients, brew plan, or recipes with required effects")
+    parser.add_argument("input", nargs="?", default="-", help="inventories file, stdin if - or omitted")
+    parser.add_argument("--format", choices=["jsonl", "csv"],
+                        help="input format, guessed from file extension (jsonl for stdin)")
+    parser.add_argument("--output", default="-", help="results file, stdout if - or omitted")
+    parser.add_argument("--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--data-folder", help="folder with alchemy_effects.json")
+    parser.add_argument("--max-ingredients", type=int, choices=[2, 3], default=3, dest="max_ingredients_count")
+    parser.add_argument("--limit", type=int, help="maximal number of recipes per inventory")
+    parser.add_argument("--objective", choices=[Optimizer.OBJECTIVE_POTIONS, Optimizer.OBJECTIVE_VALUE],
+                        default=Optimizer.OBJECTIVE_POTIONS, help="objective of plan query")
+    parser.add_argument("--required", action="append", default=[], help="required effect of effects query")
+    parser.add_argument("--optional", action="append", default=[], help="optional effect of effects query")
+    parser.add_argument("--forbidden", action="append", default=[], help="forbidden effect of effects query")
+    parser.add_argument("--forbid-negative-effects", action="store_true")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = _create_parser().parse_args(argv)
+    if args.query == QUERY_EFFECTS and not args.required:
+        print("effects query needs at least one --required effect", file=sys.stderr)
+        return 2
+    if args.data_folder:
+        DataHandler.set_data_folder_path(args.data_folder)
+    input_format = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    options = {"max_ingredients_count": args.max_ingredients_count, "limit": args.limit,
+               "objective": args.objective, "required": args.required, "optional": args.optional,
+               "forbidden": args.forbidden, "forbid_negative_effects": args.forbid_negative_effects}
+
+    input_file = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8", newline="")
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    errors_count = 0
+    try:
+        inventories = iter_csv_inventories(input_file) if input_format == "csv" \
+            else iter_jsonl_inventories(input_file)
+        for result in iter_results(args.query, inventories, options, args.workers):
+            errors_count += "error" in result
+            output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output_file.flush()
+    except ValueError as exception:
+        print(exception, file=sys.stderr)
+        return 2
+    except BrokenPipeError:
+        # reader of the output (e.g. head) exited, remaining results are not needed; stdout is pointed at devnull
+        # so the flush at interpreter exit does not fail again
+        if output_file is sys.stdout:
+            devnull_fd = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull_fd, sys.stdout.fileno())
+            os.close(devnull_fd)
+        return 0
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    return 1 if errors_count else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
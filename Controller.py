@@ -1,28 +1,178 @@
 from DataHandler import DataHandler
-import itertools
+from LRUCache import LRUCache
+from Profiling import profiled
+from QueryClient import served
 
+_query_cache = LRUCache(max_size=4096)
+DataHandler.add_reload_listener(_query_cache.clear)
+_parallel_enumerator = None
 
+
+def _get_parallel_enumerator(snapshot, max_workers):
+    """Returns process pool enumerator for snapshot, started on first use and kept until data or worker count
+    changes"""
+    # multiprocessing is imported only when needed, it slows down start of the GUI
+    from ParallelRecipes import ParallelRecipeEnumerator
+    global _parallel_enumerator
+    if _parallel_enumerator is None or _parallel_enumerator.effect_index is not snapshot.effect_index \
+            or _parallel_enumerator.max_workers != max_workers:
+        close_parallel_enumerator()
+        _parallel_enumerator = ParallelRecipeEnumerator(snapshot.effect_index, max_workers)
+    return _parallel_enumerator
+
+
+def close_parallel_enumerator():
+    """Stops worker processes used by parallel queries"""
+    global _parallel_enumerator
+    if _parallel_enumerator is not None:
+        _parallel_enumerator.close()
+        _parallel_enumerator = None
+
+
+DataHandler.add_reload_listener(close_parallel_enumerator)
+
+
+def set_query_cache_size(max_size):
+    """Sets maximal number of cached query results"""
+    _query_cache.set_max_size(max_size)
+
+
+def clear_query_cache():
+    _query_cache.clear()
+
+
+def get_query_cache_stats() -> dict:
+    """Returns dict with size, max_size, hits, misses and evictions of query cache"""
+    return _query_cache.get_stats()
+
+
+def _to_recipes(result):
+    return iter([(tuple(ingredients), set(effects)) for ingredients, effects in result])
+
+
+@profiled
+@served(set)
 def get_common_effects(ingredient1, ingredient2):
     """Returns set of effects created by combination of two ingredients"""
-    effects_ing1 = set()
-    effects_ing2 = set()
-    data_handler = DataHandler()
-    for effect in data_handler.alchemy_effects_to_ingredients_dict:
-        if ingredient1 in data_handler.alchemy_effects_to_ingredients_dict[effect]:
-            effects_ing1.add(effect)
-        if ingredient2 in data_handler.alchemy_effects_to_ingredients_dict[effect]:
-            effects_ing2.add(effect)
-    return effects_ing1.intersection(effects_ing2)
-
-
-def get_possible_effects_combinations(selected_ingredients_set):
-    """Returns dict effect -> set of pairs of ingredients (tuples)"""
+    key = ("pair", *sorted((ingredient1, ingredient2)))
+    return set(_query_cache.get_or_compute(key, lambda: _get_effects(ingredient1, ingredient2)))
+
+
+@profiled
+@served(set)
+def get_triple_effects(ingredient1, ingredient2, ingredient3):
+    """Returns set of effects created by combination of three ingredients"""
+    key = ("triple", *sorted((ingredient1, ingredient2, ingredient3)))
+    return set(_query_cache.get_or_compute(key, lambda: _get_effects(ingredient1, ingredient2, ingredient3)))
+
+
+@profiled
+@served(lambda result: frozenset(map(tuple, result)))
+def get_recipes_with_effect(effect, max_ingredients_count=3) -> frozenset:
+    """Returns frozenset of combinations of two or three ingredients (tuples) creating effect"""
+    key = ("effect", effect, max_ingredients_count)
+    return _query_cache.get_or_compute(key, lambda: _get_recipes_with_effect(effect, max_ingredients_count))
+
+
+def _get_effects(*ingredients) -> frozenset:
+    effect_index = DataHandler().snapshot.effect_index
+    masks = [effect_index.get_effects_mask(ingredient) for ingredient in ingredients]
+    effects_mask = 0
+    for i in range(len(masks)):
+        for j in range(i + 1, len(masks)):
+            effects_mask |= masks[i] & masks[j]
+    return frozenset(effect_index.mask_to_effects(effects_mask))
+
+
+def _get_recipes_with_effect(effect, max_ingredients_count) -> frozenset:
+    snapshot = DataHandler().snapshot
+    effect_index = snapshot.effect_index
+    effect_id = effect_index.effect_ids_dict.get(effect)
+    if effect_id is None:
+        return frozenset()
+    all_mask = (1 << len(effect_index.ingredients_list)) - 1
+    ingredients_list = effect_index.ingredients_list
+    return frozenset(
+        tuple(ingredients_list[i] for i in ingredient_ids)
+        for ingredient_ids, effects_mask in snapshot.get_recipes_source(all_mask).iter_recipes(
+            all_mask, max_ingredients_count)
+        if effects_mask >> effect_id & 1)
+
+
+@profiled
+@served(lambda result: {effect: set(map(tuple, combinations)) for effect, combinations in result.items()})
+def get_possible_effects_combinations(selected_ingredients_set, max_ingredients_count=3, max_workers=1):
+    """Returns dict effect -> set of combinations of two or three ingredients (tuples). Triples whose third
+    ingredient adds no new effect are skipped. With max_workers > 1 recipes are enumerated and grouped by effect in
+    that many processes, giving the same result."""
+    snapshot = DataHandler().snapshot
+    effect_index = snapshot.effect_index
+    effects_list = effect_index.effects_list
+    ingredients_list = effect_index.ingredients_list
+    ingredients_mask = effect_index.get_ingredients_mask(selected_ingredients_set)
+    if max_workers > 1:
+        return _get_parallel_enumerator(snapshot, max_workers).get_effects_combinations(
+            ingredients_mask, max_ingredients_count)
     effects_to_ingredients = dict()
-    for pair in itertools.combinations(selected_ingredients_set, 2):
-        effects_list = get_common_effects(pair[0], pair[1])
-        for effect in effects_list:
-            if effect in effects_to_ingredients.keys():
-                effects_to_ingredients[effect].add(pair)
-            else:
-                effects_to_ingredients[effect] = {pair, }
+    for ingredient_ids, effects_mask in snapshot.get_recipes_source(ingredients_mask).iter_recipes(
+            ingredients_mask, max_ingredients_count):
+        combination = tuple(ingredients_list[ingredient_id] for ingredient_id in ingredient_ids)
+        for effect_id in effect_index.mask_to_ids(effects_mask):
+            effects_to_ingredients.setdefault(effects_list[effect_id], set()).add(combination)
     return effects_to_ingredients
+
+
+@profiled
+@served(_to_recipes)
+def iter_possible_recipes(selected_ingredients_set, max_ingredients_count=3):
+    """Yields (combination of ingredients, set of effects) for every recipe made of selected ingredients, like
+    get_possible_effects_combinations but without building the whole result"""
+    snapshot = DataHandler().snapshot
+    effect_index = snapshot.effect_index
+    ingredients_list = effect_index.ingredients_list
+    ingredients_mask = effect_index.get_ingredients_mask(selected_ingredients_set)
+    for ingredient_ids, effects_mask in snapshot.get_recipes_source(ingredients_mask).iter_recipes(
+            ingredients_mask, max_ingredients_count):
+        yield tuple(ingredients_list[i] for i in ingredient_ids), effect_index.mask_to_effects(effects_mask)
+
+
+@profiled
+@served(_to_recipes)
+def iter_recipes_for_effects(required_effects, optional_effects=(), forbidden_effects=(),
+                             forbid_negative_effects=False, available_ingredients=None, max_ingredients_count=3):
+    """Yields (combination of ingredients, set of effects) for every recipe creating all required effects and none of
+    forbidden effects. With forbid_negative_effects, every negative effect which is not required or optional is
+    forbidden too. Recipes are yielded in ranked order, most optional effects first and pairs before triples with
+    the same number of optional effects; every rank is generated separately, so first hits come immediately."""
+    snapshot = DataHandler().snapshot
+    effect_index = snapshot.effect_index
+    if any(effect not in effect_index.effect_ids_dict for effect in required_effects):
+        return
+    required_mask = _get_effects_mask(effect_index, required_effects)
+    optional_mask = _get_effects_mask(effect_index, optional_effects) & ~required_mask
+    forbidden_mask = _get_effects_mask(effect_index, forbidden_effects)
+    if forbid_negative_effects:
+        forbidden_mask |= effect_index.negative_effects_mask & ~required_mask & ~optional_mask
+    if required_mask & forbidden_mask:
+        return
+    ingredients_mask = None if available_ingredients is None \
+        else effect_index.get_ingredients_mask(available_ingredients)
+
+    ingredients_list = effect_index.ingredients_list
+    for optional_count in range(optional_mask.bit_count(), -1, -1):
+        for ingredients_count in range(2, max_ingredients_count + 1):
+            for ingredient_ids, effects_mask in effect_index.iter_recipes_having(
+                    required_mask, ingredients_mask, ingredients_count):
+                if len(ingredient_ids) != ingredients_count or effects_mask & forbidden_mask \
+                        or (effects_mask & optional_mask).bit_count() != optional_count:
+                    continue
+                yield tuple(ingredients_list[i] for i in ingredient_ids), effect_index.mask_to_effects(effects_mask)
+
+
+def _get_effects_mask(effect_index, effects) -> int:
+    mask = 0
+    for effect in effects:
+        effect_id = effect_index.effect_ids_dict.get(effect)
+        if effect_id is not None:
+            mask |= 1 << effect_id
+    return mask
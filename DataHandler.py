@@ -1,9 +1,71 @@
+import functools
 import json
 import os
+import sys
+import threading
+from EffectIndex import EffectIndex
+from RecipeTable import RecipeTable, build_recipe_table, get_file_hash
+from Profiling import profiled
+
+EFFECT_VALUE_FIELDS = ("base_magnitude", "base_duration", "base_cost", "ingredient_multipliers")
+
+
+class DataSnapshot:
+    """Complete set of alchemy data built at once. Snapshots are never modified after creation: reload builds a new
+    one and swaps it in, so a reader holding a snapshot always sees consistent dicts and indexes."""
+
+    def __init__(self, alchemy_effects_to_ingredients_dict: dict, alchemy_effects_to_effect_type_dict: dict,
+                 recipe_table=None, alchemy_effects_to_values_dict: dict = None, data_file_path=None):
+        self.alchemy_effects_to_ingredients_dict: dict = alchemy_effects_to_ingredients_dict
+        self.alchemy_effects_to_effect_type_dict: dict = alchemy_effects_to_effect_type_dict
+        self.effect_index = EffectIndex(alchemy_effects_to_ingredients_dict, alchemy_effects_to_effect_type_dict)
+        self.recipe_table = recipe_table
+        self._alchemy_effects_to_values_dict = alchemy_effects_to_values_dict
+        self._data_file_path = data_file_path
+
+    @functools.cached_property
+    def ingredients_set(self) -> frozenset:
+        return frozenset(self.effect_index.ingredients_list)
+
+    @functools.cached_property
+    def ingredients_to_alchemy_effects_dict(self) -> dict:
+        """Built on first use, the core works on ids from effect_index"""
+        effect_index = self.effect_index
+        return {ingredient.name: frozenset(effect_index.mask_to_effects(ingredient.effects_mask))
+                for ingredient in effect_index.ingredients}
+
+    @functools.cached_property
+    def alchemy_effects_to_values_dict(self) -> dict:
+        """Returns dict effect -> dict of its value fields present in data file (base_magnitude, base_duration,
+        base_cost, ingredient_multipliers). The recipe table does not store them, so a snapshot loaded from it
+        reads them from the data file on first use."""
+        if self._alchemy_effects_to_values_dict is not None:
+            return self._alchemy_effects_to_values_dict
+        with open(self._data_file_path, "r", encoding="utf-8") as f:
+            return _get_effects_to_values_dict(json.load(f))
+
+    def get_recipes_source(self, ingredients_mask):
+        """Returns object with iter_recipes for given selection of ingredients: precomputed recipe table when most
+        ingredients are selected (scanning it is then cheaper than enumerating), otherwise effect index"""
+        if self.recipe_table is not None \
+                and ingredients_mask.bit_count() * 4 >= len(self.effect_index.ingredients_list) * 3:
+            return self.recipe_table
+        return self.effect_index
+
+
+def _get_effects_to_values_dict(alchemy_effects_list: list) -> dict:
+    return {item['name']: {field: item[field] for field in EFFECT_VALUE_FIELDS if field in item}
+            for item in alchemy_effects_list}
+
 
 class DataHandler:
     _instance = None
     _data_folder_path = "data"
+    _data_file_name = "alchemy_effects.json"
+    _recipe_table_file_name = "alchemy_effects.recipes"
+    _session_store_file_name = "session.sqlite3"
+    _acquisition_file_name = "acquisition.json"
+    _reload_listeners = []
 
     def __new__(cls):
         if cls._instance is None:
@@ -12,27 +74,160 @@ class DataHandler:
         return cls._instance
 
     def _init_data(self):
-        file_path = f"{DataHandler._data_folder_path}/alchemy_effects.json"
+        self._reload_lock = threading.Lock()
+        self._watcher_thread = None
+        self._watcher_stop_event = threading.Event()
+        self.snapshot = self._load_snapshot()
+
+    @profiled
+    def _load_snapshot(self) -> DataSnapshot:
+        file_path = self.get_data_file_path()
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File {file_path} not found.")
 
+        recipe_table = self._load_recipe_table(get_file_hash(file_path))
+        if recipe_table is not None:
+            return DataSnapshot(recipe_table.get_alchemy_effects_to_ingredients_dict(),
+                                dict(zip(recipe_table.effects_list, recipe_table.effect_types_list)), recipe_table,
+                                data_file_path=file_path)
+
         with open(file_path, "r", encoding="utf-8") as f:
             alchemy_effects_list = json.load(f)
-            self.alchemy_effects_to_ingredients_dict = {
+            alchemy_effects_to_ingredients_dict = {
                 item['name']: item['ingredients'] for item in alchemy_effects_list
             }
-            self.alchemy_effects_to_effect_type_dict = {
+            alchemy_effects_to_effect_type_dict = {
                 item['name']: item['type'] for item in alchemy_effects_list
             }
+        return DataSnapshot(alchemy_effects_to_ingredients_dict, alchemy_effects_to_effect_type_dict,
+                            alchemy_effects_to_values_dict=_get_effects_to_values_dict(alchemy_effects_list))
+
+    @property
+    def alchemy_effects_to_ingredients_dict(self) -> dict:
+        return self.snapshot.alchemy_effects_to_ingredients_dict
+
+    @property
+    def alchemy_effects_to_effect_type_dict(self) -> dict:
+        return self.snapshot.alchemy_effects_to_effect_type_dict
+
+    @property
+    def ingredients_set(self) -> frozenset:
+        return self.snapshot.ingredients_set
+
+    @property
+    def ingredients_to_alchemy_effects_dict(self) -> dict:
+        return self.snapshot.ingredients_to_alchemy_effects_dict
+
+    @property
+    def effect_index(self) -> EffectIndex:
+        return self.snapshot.effect_index
+
+    @property
+    def recipe_table(self):
+        return self.snapshot.recipe_table
+
+    def get_recipes_source(self, ingredients_mask):
+        return self.snapshot.get_recipes_source(ingredients_mask)
+
+    @profiled
+    def reload(self):
+        """Builds new snapshot from data files, swaps it in and notifies reload listeners, so dependent caches can
+        be invalidated. Listeners are called in the thread which reloaded the data; a failing listener is reported
+        to sys.excepthook and does not stop the others."""
+        with self._reload_lock:
+            self.snapshot = self._load_snapshot()
+        for listener in list(DataHandler._reload_listeners):
+            try:
+                listener()
+            except Exception:
+                sys.excepthook(*sys.exc_info())
+
+    @staticmethod
+    def add_reload_listener(listener):
+        """Registers function called without arguments after data is reloaded"""
+        DataHandler._reload_listeners.append(listener)
+
+    @staticmethod
+    def remove_reload_listener(listener):
+        DataHandler._reload_listeners.remove(listener)
+
+    def start_watching(self, interval=1.0):
+        """Starts background thread polling data folder every interval seconds and reloading data when the data file
+        changes. A data file which fails to load (e.g. is saved only partially) keeps the previous snapshot."""
+        if self._watcher_thread is not None:
+            return
+        self._watcher_stop_event.clear()
+        self._watcher_thread = threading.Thread(target=self._watch, args=(interval,), name="DataHandlerWatcher",
+                                                daemon=True)
+        self._watcher_thread.start()
+
+    def stop_watching(self):
+        if self._watcher_thread is None:
+            return
+        self._watcher_stop_event.set()
+        self._watcher_thread.join()
+        self._watcher_thread = None
+
+    def _get_data_file_stamp(self):
+        try:
+            stat = os.stat(self.get_data_file_path())
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _watch(self, interval):
+        last_stamp = self._get_data_file_stamp()
+        while not self._watcher_stop_event.wait(interval):
+            stamp = self._get_data_file_stamp()
+            if stamp is None or stamp == last_stamp:
+                continue
+            try:
+                self.reload()
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+            last_stamp = stamp
+
+    @profiled
+    def build_recipe_table(self):
+        """Writes recipe table of current data, so following starts skip parsing json"""
+        snapshot = self.snapshot
+        build_recipe_table(self.get_data_file_path(), self.get_recipe_table_path(),
+                           snapshot.alchemy_effects_to_ingredients_dict, snapshot.alchemy_effects_to_effect_type_dict)
+
+    def _load_recipe_table(self, json_hash):
+        """Returns memory-mapped recipe table if it was built from json with given hash, otherwise None"""
+        table_path = self.get_recipe_table_path()
+        if not os.path.exists(table_path):
+            return None
+        try:
+            recipe_table = RecipeTable(table_path)
+        except (ValueError, OSError):
+            return None
+        return recipe_table if recipe_table.json_hash == json_hash else None
+
+    @staticmethod
+    def set_data_folder_path(data_folder_path):
+        """Points DataHandler to another data folder, reloading data if it was already loaded"""
+        DataHandler._data_folder_path = data_folder_path
+        if DataHandler._instance is not None:
+            DataHandler._instance.reload()
+
+    @staticmethod
+    def get_data_file_path():
+        return f"{DataHandler._data_folder_path}/{DataHandler._data_file_name}"
+
+    @staticmethod
+    def get_recipe_table_path():
+        return f"{DataHandler._data_folder_path}/{DataHandler._recipe_table_file_name}"
 
-            self.ingredients_set = {ingredient for ingredients in self.alchemy_effects_to_ingredients_dict.values()
-                                    for ingredient in ingredients}
+    @staticmethod
+    def get_acquisition_file_path():
+        return f"{DataHandler._data_folder_path}/{DataHandler._acquisition_file_name}"
 
-        self.ingredients_to_alchemy_effects_dict = {}
-        for effect, ingredients in self.alchemy_effects_to_ingredients_dict.items():
-            for ingredient in ingredients:
-                self.ingredients_to_alchemy_effects_dict.setdefault(ingredient, set()).add(effect)
+    @staticmethod
+    def get_session_store_path():
+        return f"{DataHandler._data_folder_path}/{DataHandler._session_store_file_name}"
 
 if __name__ == '__main__':
     dh = DataHandler()
-    print(dh.ingredients_to_alchemy_effects_dict)
\ No newline at end of file
+    print(dh.ingredients_to_alchemy_effects_dict)
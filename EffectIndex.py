@@ -0,0 +1,214 @@
+import sys
+
+
+class Ingredient:
+    """Ingredient record; name is only needed for display"""
+    __slots__ = ("id", "name", "effects_mask", "partners_mask")
+
+    def __init__(self, ingredient_id: int, name: str, effects_mask: int, partners_mask: int):
+        self.id = ingredient_id
+        self.name = name
+        self.effects_mask = effects_mask
+        self.partners_mask = partners_mask
+
+
+class Effect:
+    """Effect record; name is only needed for display"""
+    __slots__ = ("id", "name", "is_negative", "ingredients_mask")
+
+    def __init__(self, effect_id: int, name: str, is_negative: bool, ingredients_mask: int):
+        self.id = effect_id
+        self.name = name
+        self.is_negative = is_negative
+        self.ingredients_mask = ingredients_mask
+
+
+class EffectIndex:
+    """Compiled ingredient/effect index. Every ingredient and effect gets an integer id (position in sorted order),
+    every ingredient gets a bitmask of its effects and every effect gets a bitmask of its ingredients. Names are
+    interned and only used to translate ids for display."""
+
+    def __init__(self, alchemy_effects_to_ingredients_dict: dict, alchemy_effects_to_effect_type_dict: dict = None):
+        self.effects_list: tuple = tuple(sorted(sys.intern(effect) for effect in alchemy_effects_to_ingredients_dict))
+        self.ingredients_list: tuple = tuple(sorted({sys.intern(ingredient)
+                                                     for ingredients in alchemy_effects_to_ingredients_dict.values()
+                                                     for ingredient in ingredients}))
+        self.effect_ids_dict: dict = {effect: i for i, effect in enumerate(self.effects_list)}
+        self.ingredient_ids_dict: dict = {ingredient: i for i, ingredient in enumerate(self.ingredients_list)}
+
+        self.ingredient_masks_list: list = [0] * len(self.ingredients_list)
+        self.effect_ingredients_masks_list: list = [0] * len(self.effects_list)
+        for effect, ingredients in alchemy_effects_to_ingredients_dict.items():
+            effect_id = self.effect_ids_dict[effect]
+            for ingredient in ingredients:
+                ingredient_id = self.ingredient_ids_dict[ingredient]
+                self.ingredient_masks_list[ingredient_id] |= 1 << effect_id
+                self.effect_ingredients_masks_list[effect_id] |= 1 << ingredient_id
+
+        self.ingredient_partners_masks_list: list = [self.get_partners_mask(mask) & ~(1 << ingredient_id)
+                                                     for ingredient_id, mask in enumerate(self.ingredient_masks_list)]
+
+        self.negative_effects_mask: int = 0
+        for effect, effect_type in (alchemy_effects_to_effect_type_dict or {}).items():
+            if effect_type == "negative" and effect in self.effect_ids_dict:
+                self.negative_effects_mask |= 1 << self.effect_ids_dict[effect]
+
+        self.ingredients: tuple = tuple(
+            Ingredient(i, name, self.ingredient_masks_list[i], self.ingredient_partners_masks_list[i])
+            for i, name in enumerate(self.ingredients_list))
+        self.effects: tuple = tuple(
+            Effect(i, name, bool(self.negative_effects_mask >> i & 1), self.effect_ingredients_masks_list[i])
+            for i, name in enumerate(self.effects_list))
+
+    @classmethod
+    def from_ingredient_masks(cls, ingredient_masks_list: list, effects_count: int):
+        """Returns index built from effect bitmasks of ingredients only, with ids used as names"""
+        alchemy_effects_to_ingredients_dict = {f"{effect_id:06d}": [] for effect_id in range(effects_count)}
+        for ingredient_id, mask in enumerate(ingredient_masks_list):
+            for effect_id in cls.mask_to_ids(mask):
+                alchemy_effects_to_ingredients_dict[f"{effect_id:06d}"].append(f"{ingredient_id:06d}")
+        effect_index = cls(alchemy_effects_to_ingredients_dict)
+        if effect_index.ingredient_masks_list != list(ingredient_masks_list):
+            raise ValueError("Every ingredient must have at least one effect.")
+        return effect_index
+
+    def get_effects_mask(self, ingredient) -> int:
+        """Returns bitmask of effects of ingredient (0 for unknown ingredient)"""
+        ingredient_id = self.ingredient_ids_dict.get(ingredient)
+        return 0 if ingredient_id is None else self.ingredient_masks_list[ingredient_id]
+
+    def get_common_mask(self, ingredient_id1: int, ingredient_id2: int) -> int:
+        """Returns bitmask of effects shared by two ingredients given by ids"""
+        return self.ingredient_masks_list[ingredient_id1] & self.ingredient_masks_list[ingredient_id2]
+
+    def mask_to_effects(self, mask: int) -> set:
+        """Returns set of effect names encoded in bitmask"""
+        effects = set()
+        while mask:
+            low_bit = mask & -mask
+            effects.add(self.effects_list[low_bit.bit_length() - 1])
+            mask ^= low_bit
+        return effects
+
+    @staticmethod
+    def mask_to_ids(mask: int) -> list:
+        """Returns sorted list of ids (bit positions) set in bitmask"""
+        ids = []
+        while mask:
+            low_bit = mask & -mask
+            ids.append(low_bit.bit_length() - 1)
+            mask ^= low_bit
+        return ids
+
+    @staticmethod
+    def count(mask: int) -> int:
+        """Returns number of bits set in bitmask"""
+        return mask.bit_count()
+
+    def get_ingredients_mask(self, ingredients) -> int:
+        """Returns bitmask of ids of known ingredients from iterable of names"""
+        mask = 0
+        for ingredient in ingredients:
+            ingredient_id = self.ingredient_ids_dict.get(ingredient)
+            if ingredient_id is not None:
+                mask |= 1 << ingredient_id
+        return mask
+
+    def get_partners_mask(self, effects_mask: int) -> int:
+        """Returns bitmask of ingredients having at least one effect from effects_mask"""
+        partners_mask = 0
+        for effect_id in self.mask_to_ids(effects_mask):
+            partners_mask |= self.effect_ingredients_masks_list[effect_id]
+        return partners_mask
+
+    def iter_recipes(self, ingredients_mask: int = None, max_ingredients_count: int = 3,
+                     first_ingredients_mask: int = None):
+        """Yields (tuple of ingredient ids, effects bitmask) for every valid recipe made of ingredients from
+        ingredients_mask (all ingredients if None). Triples are only built by extending pairs sharing an effect with
+        partners found in the inverted effect -> ingredients index, and a triple is skipped when it is dominated,
+        i.e. it produces the same effects as one of its pairs. Recipes come ordered by their first (smallest)
+        ingredient id; first_ingredients_mask limits them to a shard of first ingredients."""
+        if ingredients_mask is None:
+            ingredients_mask = (1 << len(self.ingredients_list)) - 1
+        masks = self.ingredient_masks_list
+        partners_masks = {i: self.ingredient_partners_masks_list[i] & ingredients_mask
+                          for i in self.mask_to_ids(ingredients_mask)}
+
+        for i, partners_mask_i in partners_masks.items():
+            if first_ingredients_mask is not None and not first_ingredients_mask >> i & 1:
+                continue
+            for j in self.mask_to_ids(partners_mask_i >> (i + 1) << (i + 1)):
+                pair_mask_ij = masks[i] & masks[j]
+                yield (i, j), pair_mask_ij
+                if max_ingredients_count < 3:
+                    continue
+                # every triple is emitted once, from its lexicographically smallest pair sharing an effect
+                for k in self.mask_to_ids((partners_mask_i | partners_masks[j]) >> (i + 1) << (i + 1) & ~(1 << j)):
+                    pair_mask_ik, pair_mask_jk = masks[i] & masks[k], masks[j] & masks[k]
+                    if k < j and pair_mask_ik:
+                        continue
+                    triple_mask = pair_mask_ij | pair_mask_ik | pair_mask_jk
+                    if triple_mask in (pair_mask_ij, pair_mask_ik, pair_mask_jk):
+                        continue
+                    yield ((i, j, k) if k > j else (i, k, j)), triple_mask
+
+    def iter_recipes_with(self, ingredient_id: int, ingredients_mask: int = None, max_ingredients_count: int = 3):
+        """Yields (tuple of ingredient ids, effects bitmask) for every valid recipe containing ingredient_id and other
+        ingredients from ingredients_mask (all ingredients if None), with the same pruning as iter_recipes. Work is
+        proportional to the number of partners of the ingredient, not to the number of ingredients."""
+        if ingredients_mask is None:
+            ingredients_mask = (1 << len(self.ingredients_list)) - 1
+        x = ingredient_id
+        masks = self.ingredient_masks_list
+        ingredients_mask &= ~(1 << x)
+        partners_mask_x = self.ingredient_partners_masks_list[x] & ingredients_mask
+        partners_x = self.mask_to_ids(partners_mask_x)
+        for y in partners_x:
+            yield ((x, y) if x < y else (y, x)), masks[x] & masks[y]
+        if max_ingredients_count < 3:
+            return
+
+        # a non-dominated triple has at least two pairs sharing an effect, so it contains a partner y of x;
+        # z is either a later partner of x or a partner of y only, so every triple is visited once
+        for y in partners_x:
+            pair_mask_xy = masks[x] & masks[y]
+            partners_mask_yz = partners_mask_x >> (y + 1) << (y + 1) \
+                | self.ingredient_partners_masks_list[y] & ingredients_mask & ~partners_mask_x
+            for z in self.mask_to_ids(partners_mask_yz & ~(1 << y)):
+                pair_mask_xz, pair_mask_yz = masks[x] & masks[z], masks[y] & masks[z]
+                triple_mask = pair_mask_xy | pair_mask_xz | pair_mask_yz
+                if triple_mask in (pair_mask_xy, pair_mask_xz, pair_mask_yz):
+                    continue
+                yield tuple(sorted((x, y, z))), triple_mask
+
+    def iter_recipes_having(self, effects_mask: int, ingredients_mask: int = None, max_ingredients_count: int = 3):
+        """Yields (tuple of ingredient ids, effects bitmask) for every valid recipe from ingredients_mask (all
+        ingredients if None) creating all effects from effects_mask, with the same pruning as iter_recipes. Two
+        ingredients of such recipe must have the rarest required effect, so only those are paired."""
+        if ingredients_mask is None:
+            ingredients_mask = (1 << len(self.ingredients_list)) - 1
+        if not effects_mask:
+            yield from self.iter_recipes(ingredients_mask, max_ingredients_count)
+            return
+        masks = self.ingredient_masks_list
+        rarest_effect_id = min(self.mask_to_ids(effects_mask), key=lambda effect_id: (
+                self.effect_ingredients_masks_list[effect_id] & ingredients_mask).bit_count())
+        carriers_mask = self.effect_ingredients_masks_list[rarest_effect_id] & ingredients_mask
+        carriers = self.mask_to_ids(carriers_mask)
+        for a_position, a in enumerate(carriers):
+            for b in carriers[a_position + 1:]:
+                pair_mask_ab = masks[a] & masks[b]
+                if pair_mask_ab & effects_mask == effects_mask:
+                    yield (a, b), pair_mask_ab
+                if max_ingredients_count < 3:
+                    continue
+                # a triple with three carriers is emitted only from its two smallest ones
+                third_mask = (self.ingredient_partners_masks_list[a] | self.ingredient_partners_masks_list[b]) \
+                    & ingredients_mask & ~(1 << a) & ~(1 << b) & ~(carriers_mask & ((1 << b) - 1))
+                for c in self.mask_to_ids(third_mask):
+                    pair_mask_ac, pair_mask_bc = masks[a] & masks[c], masks[b] & masks[c]
+                    triple_mask = pair_mask_ab | pair_mask_ac | pair_mask_bc
+                    if triple_mask & effects_mask != effects_mask \
+                            or triple_mask in (pair_mask_ab, pair_mask_ac, pair_mask_bc):
+                        continue
+                    yield tuple(sorted((a, b, c))), triple_mask
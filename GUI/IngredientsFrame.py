@@ -1,31 +1,87 @@
+import json
+import os
+import zlib
+from array import array
 from PySide6.QtGui import QFontMetrics, QColor
-from PySide6.QtWidgets import QStyledItemDelegate, QSpinBox, QTableView, QApplication, QWidget, QVBoxLayout, QLineEdit
+from PySide6.QtWidgets import QStyledItemDelegate, QSpinBox, QTableView, QApplication, QWidget, QVBoxLayout, \
+    QLineEdit, QComboBox, QPushButton, QFileDialog, QMessageBox
 from DataHandler import DataHandler
-from PySide6.QtCore import QAbstractTableModel, Qt, QSortFilterProxyModel
+from GUI.QtJobRunner import QtJobRunner
+from InventoryImport import MAX_COUNT, import_inventory
+from Optimizer import plan_brews
+from RecipeSet import IncrementalRecipeSet
+from SearchIndex import SearchIndex
+from SessionStore import SessionStore
+from Translations import DEFAULT_LOCALE, get_available_locales, get_locale_table
+from PySide6.QtCore import QAbstractTableModel, Qt, QSortFilterProxyModel, Signal
+from Profiling import profiled
+
+
+class PinRegistry:
+    """Pinned source rows in pinning order. Membership and sort key lookups are O(1): every pin gets an increasing
+    sequence number, so unpinning a row does not renumber the others."""
+
+    def __init__(self):
+        self._sequence_numbers_dict: dict = {}
+        self._next_sequence_number = 0
+
+    def __contains__(self, row):
+        return row in self._sequence_numbers_dict
+
+    def __iter__(self):
+        return iter(self._sequence_numbers_dict)
+
+    def __len__(self):
+        return len(self._sequence_numbers_dict)
+
+    def toggle(self, row) -> bool:
+        """Pins or unpins row, returns True if row is pinned now"""
+        if self._sequence_numbers_dict.pop(row, None) is not None:
+            return False
+        self._sequence_numbers_dict[row] = self._next_sequence_number
+        self._next_sequence_number += 1
+        return True
+
+    def set_rows(self, rows):
+        """Replaces pins with rows, keeping their order"""
+        self._sequence_numbers_dict = {row: sequence_number for sequence_number, row in enumerate(rows)}
+        self._next_sequence_number = len(self._sequence_numbers_dict)
+
+    def get_sort_key(self, row) -> int:
+        """Returns row for not pinned rows and a negative number for pinned rows, ordered by pinning order"""
+        sequence_number = self._sequence_numbers_dict.get(row)
+        return row if sequence_number is None else -sequence_number - 1
 
 
 class IngredientsTableModel(QAbstractTableModel):
-    def __init__(self, data_list: list, pinned_rows_list: list):
+    """Rows are ingredient ids of effect index, so names are only looked up when displayed and counts are kept in
+    a compact array. ingredient_names are the English names used as keys, display_names the translated ones."""
+    count_changed = Signal(str, int)
+    counts_changed = Signal(dict)
+
+    def __init__(self, ingredient_names: tuple, pin_registry: PinRegistry):
         super().__init__()
-        self.data_list: list = data_list
-        self.pinned_rows_list: list = pinned_rows_list
+        self.ingredient_names: tuple = ingredient_names
+        self.rows_dict: dict = {name: row for row, name in enumerate(ingredient_names)}
+        self.display_names: tuple = ingredient_names
+        self.counts_array: array = array("I", bytes(4 * len(ingredient_names)))
+        self.pin_registry: PinRegistry = pin_registry
         self.owned_ingredients_dict: dict = {}
 
     def rowCount(self, index=None):
-        return len(self.data_list)
+        return len(self.ingredient_names)
 
     def columnCount(self, index=None):
         return 2
 
+    @profiled
     def data(self, index, role):
         if not index.isValid():
             return None
 
-        value = self.data_list[index.row()][index.column()]
-
         if role == Qt.DisplayRole or role == Qt.EditRole:
-            return str(value) if index.column() == 0 else value
-        elif role == Qt.BackgroundRole and index.row() in self.pinned_rows_list:
+            return self.display_names[index.row()] if index.column() == 0 else self.counts_array[index.row()]
+        elif role == Qt.BackgroundRole and index.row() in self.pin_registry:
             return QColor(200, 200, 255)
 
         return None
@@ -42,65 +98,118 @@ class IngredientsTableModel(QAbstractTableModel):
             return ["Ingredient", "Count"][section]
         return None
 
+    @profiled
     def setData(self, index, value, role=Qt.EditRole):
-        if role == Qt.EditRole and index.isValid():
+        if role == Qt.EditRole and index.isValid() and index.column() == 1:
             if value == 0:
-                self.owned_ingredients_dict.pop(self.data_list[index.row()][0], None)
+                self.owned_ingredients_dict.pop(self.ingredient_names[index.row()], None)
             else:
-                self.owned_ingredients_dict[self.data_list[index.row()][0]] = value
+                self.owned_ingredients_dict[self.ingredient_names[index.row()]] = value
 
-            self.data_list[index.row()][index.column()] = value
+            self.counts_array[index.row()] = value
             self.dataChanged.emit(index, index)
+            self.count_changed.emit(self.ingredient_names[index.row()], value)
             return True
         return False
 
+    @profiled
+    def set_counts(self, counts_dict: dict, replace=False) -> dict:
+        """Sets counts of many ingredients at once: owned_ingredients_dict is updated in one pass and a single
+        dataChanged covering the changed rows is emitted, so the proxy and recipe updates run once instead of per
+        cell. With replace, ingredients missing in counts_dict are set to 0. Unknown ingredients are ignored.
+        Returns dict ingredient -> new count of changed ingredients, which is also emitted as counts_changed.
+        Raises ValueError before changing anything if a count is not a whole number from 0 to MAX_COUNT."""
+        for name, count in counts_dict.items():
+            if not isinstance(count, int) or not 0 <= count <= MAX_COUNT:
+                raise ValueError(f"Invalid count of {name}: {count!r}")
+        if replace:
+            counts_dict = {**dict.fromkeys(self.owned_ingredients_dict, 0), **counts_dict}
+        changed_counts_dict = {}
+        first_row = last_row = None
+        for name, count in counts_dict.items():
+            row = self.rows_dict.get(name)
+            if row is None or self.counts_array[row] == count:
+                continue
+            self.counts_array[row] = count
+            if count:
+                self.owned_ingredients_dict[name] = count
+            else:
+                self.owned_ingredients_dict.pop(name, None)
+            changed_counts_dict[name] = count
+            first_row = row if first_row is None else min(first_row, row)
+            last_row = row if last_row is None else max(last_row, row)
+        if changed_counts_dict:
+            self.dataChanged.emit(self.index(first_row, 1), self.index(last_row, 1), [Qt.DisplayRole, Qt.EditRole])
+            self.counts_changed.emit(changed_counts_dict)
+        return changed_counts_dict
+
+    @profiled
+    def reset_data(self, ingredient_names: tuple, counts_array: array, display_names: tuple = None):
+        self.beginResetModel()
+        self.ingredient_names = ingredient_names
+        self.rows_dict = {name: row for row, name in enumerate(ingredient_names)}
+        self.display_names = display_names or ingredient_names
+        self.counts_array = counts_array
+        self.owned_ingredients_dict = {name: count for name, count in zip(ingredient_names, counts_array) if count}
+        self.endResetModel()
+
+    def set_display_names(self, display_names: tuple):
+        """Swaps translated names, rows and counts stay as they are"""
+        self.display_names = display_names
+        self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, 0), [Qt.DisplayRole])
+
+    def emit_row_changed(self, row):
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
 class IngredientsTableSortFilterProxyModel(QSortFilterProxyModel):
-    def __init__(self, pinned_rows_list: list, parent=None):
+    pin_toggled = Signal(str, bool)
+
+    def __init__(self, pin_registry: PinRegistry, search_index_factory, parent=None):
         super().__init__(parent)
-        self.pinned_rows_list: list = pinned_rows_list
+        self.pin_registry: PinRegistry = pin_registry
+        self.search_index_factory = search_index_factory
+        self.search_index = None
         self.filter_text = ""
+        self.matching_rows = None
 
+    @profiled
     def toggle_pin(self, row):
-        if row in self.pinned_rows_list:
-            self.pinned_rows_list.remove(row)
-        else:
-            self.pinned_rows_list.append(row)
-
-        proxy_index = self.index(row, 0)
-        self.dataChanged.emit(proxy_index, proxy_index)
-        self.invalidate()
+        # with dynamic sorting the proxy moves only the changed row instead of re-sorting everything
+        pinned = self.pin_registry.toggle(row)
+        self.sourceModel().emit_row_changed(row)
+        self.pin_toggled.emit(self.sourceModel().ingredient_names[row], pinned)
 
+    @profiled
     def lessThan(self, left, right):
+        return self.pin_registry.get_sort_key(left.row()) > self.pin_registry.get_sort_key(right.row())
 
-        left_row = left.row()
-        right_row = right.row()
-
-        if left_row in self.pinned_rows_list:
-            left_row = -self.pinned_rows_list.index(left_row) - 1
-
-        if right_row in self.pinned_rows_list:
-            right_row = -self.pinned_rows_list.index(right_row)- 1
-
-        return left_row > right_row
-
+    @profiled
     def filterAcceptsRow(self, source_row, source_parent):
-        if self.filter_text:
-            index = self.sourceModel().index(source_row, 0, source_parent)
-            name = self.sourceModel().data(index, Qt.DisplayRole).lower()
-            return self.filter_text.lower() in name
-        return True
+        return self.matching_rows is None or source_row in self.matching_rows
 
+    @profiled
     def setFilterText(self, text):
         self.filter_text = text
+        self.matching_rows = self.get_search_index().search(text)
         self.invalidateFilter()
 
+    def get_search_index(self) -> SearchIndex:
+        """Returns search index, building it on first use"""
+        if self.search_index is None:
+            self.search_index = self.search_index_factory()
+        return self.search_index
+
+    def reset_search_index(self):
+        self.search_index = None
+        self.setFilterText(self.filter_text)
+
 class SpinBoxDelegate(QStyledItemDelegate):
 
     def createEditor(self, parent, option, index):
         if index.column() == 1:
             spinbox = QSpinBox(parent)
             spinbox.setMinimum(0)
-            spinbox.setMaximum(1000000)
+            spinbox.setMaximum(MAX_COUNT)
             return spinbox
         return super().createEditor(parent, option, index)
 
@@ -113,6 +222,29 @@ class SpinBoxDelegate(QStyledItemDelegate):
         if index.column() == 1:
             model.setData(index, editor.value(), Qt.EditRole)
 
+def get_max_text_width(font, texts) -> int:
+    """Returns width of the widest text in font. Widths are cached in data folder between runs, measuring every
+    name is one of the slowest steps of startup."""
+    cache_path = f"{DataHandler._data_folder_path}/ui_cache.json"
+    texts_checksum = zlib.crc32("\n".join(texts).encode("utf-8"))
+    key = f"{font.toString()}|{texts_checksum}"
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache_dict = json.load(f)
+    except (OSError, ValueError):
+        cache_dict = {}
+    if key not in cache_dict:
+        font_metrics = QFontMetrics(font)
+        cache_dict = {key: max((font_metrics.horizontalAdvance(text) for text in texts), default=0)}
+        try:
+            with open(f"{cache_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(cache_dict, f)
+            os.replace(f"{cache_path}.tmp", cache_path)
+        except OSError:
+            pass
+    return cache_dict[key]
+
+
 class IngredientTableView(QTableView):
     def __init__(self, model):
         super().__init__()
@@ -121,8 +253,11 @@ class IngredientTableView(QTableView):
         self.setItemDelegateForColumn(1, SpinBoxDelegate())
         self.horizontalHeader().setStretchLastSection(True)
         self.verticalHeader().setVisible(False)
-        max_ingredient_string_width = max(
-            QFontMetrics(self.font()).horizontalAdvance(item[0]) for item in self.model.sourceModel().data_list) + 10
+        self.total_width = 0
+        self.update_column_widths()
+
+    def update_column_widths(self):
+        max_ingredient_string_width = get_max_text_width(self.font(), self.model.sourceModel().display_names) + 10
         self.setColumnWidth(0, max_ingredient_string_width)
         three_digit_string_width = QFontMetrics(self.font()).horizontalAdvance("999") + 20
         self.setColumnWidth(1, three_digit_string_width)
@@ -139,8 +274,9 @@ class IngredientTableView(QTableView):
 
         elif event.button() == Qt.LeftButton: # increase count
             source_index = self.model.mapToSource(self.model.index(index.row(), 1))
-            current_value = self.model.sourceModel().data(source_index, Qt.DisplayRole) or 0
-            self.model.sourceModel().setData(source_index, int(current_value) + 1, Qt.EditRole)
+            current_value = int(self.model.sourceModel().data(source_index, Qt.DisplayRole) or 0)
+            if current_value < MAX_COUNT:
+                self.model.sourceModel().setData(source_index, current_value + 1, Qt.EditRole)
 
         elif event.button() == Qt.RightButton: # decrease count
             source_index = self.model.mapToSource(self.model.index(index.row(), 1))
@@ -151,35 +287,196 @@ class IngredientTableView(QTableView):
 
         super().mousePressEvent(event)
 
+def _plan_brews_job(owned_ingredients_dict):
+    yield plan_brews(owned_ingredients_dict)
+
+
+def _build_recipe_table_job():
+    DataHandler().build_recipe_table()
+    return []
+
+
 class IngredientTableFrame(QWidget):
+    data_reloaded = Signal()
+    brew_plan_changed = Signal(list)
 
     def __init__(self):
         super().__init__()
         self.data_handler = DataHandler()
-        self.pinned_rows_list = []
-        input_data = [[ingredient, 0] for ingredient in sorted(self.data_handler.ingredients_set)]
-        self.model = IngredientsTableModel(input_data, self.pinned_rows_list)
-
-        self.proxy = IngredientsTableSortFilterProxyModel(self.pinned_rows_list)
+        self.pin_registry = PinRegistry()
+        self.model = IngredientsTableModel(self.data_handler.effect_index.ingredients_list, self.pin_registry)
+        self.recipe_set = IncrementalRecipeSet()
+        # only count changes replan, name and pin repaints also emit dataChanged
+        self.model.count_changed.connect(self.update_recipe_set)
+        self.model.counts_changed.connect(self.update_recipe_set_counts)
+        # reload listeners run in the watcher thread, the signal queues handling to the GUI thread
+        self._reload_listener = self.data_reloaded.emit
+        DataHandler.add_reload_listener(self._reload_listener)
+        self.data_reloaded.connect(self.on_data_reloaded)
+        self.job_runner = QtJobRunner(parent=self)
+        self.job_runner.partial_result.connect(self.on_job_result)
+        self.brew_plan = []
+        self.search_indexes_dict: dict = {}
+
+        self.proxy = IngredientsTableSortFilterProxyModel(self.pin_registry, self.create_search_index)
         self.proxy.setSourceModel(self.model)
         self.proxy.setSortRole(Qt.DisplayRole)
 
+        self.session_store = SessionStore(DataHandler.get_session_store_path())
+        self.locale_table = self.load_locale_table(self.session_store.get_setting("translation", DEFAULT_LOCALE))
+        self.restore_session()
+        self.model.count_changed.connect(self.session_store.set_count)
+        self.model.counts_changed.connect(self.session_store.set_counts)
+        self.proxy.pin_toggled.connect(self.session_store.set_pinned)
+
         self.table = IngredientTableView(self.proxy)
         self.table.setSortingEnabled(True)
 
         self.search_box = QLineEdit()
-        self.search_box.setPlaceholderText("Type name of ingredient...")
+        self.search_box.setPlaceholderText("Type name of ingredient or effect...")
         self.search_box.textChanged.connect(self.proxy.setFilterText)
 
+        self.locale_box = QComboBox()
+        for locale, language_name in get_available_locales().items():
+            self.locale_box.addItem(language_name, locale)
+        self.locale_box.setCurrentIndex(max(0, self.locale_box.findData(self.locale_table.locale)))
+        self.locale_box.currentIndexChanged.connect(
+            lambda index: self.set_locale(self.locale_box.itemData(index)))
+
+        self.import_button = QPushButton("Import inventory...")
+        self.import_button.clicked.connect(self.choose_inventory_file)
+
         layout = QVBoxLayout()
+        layout.addWidget(self.locale_box)
+        layout.addWidget(self.import_button)
         layout.addWidget(self.search_box)
         layout.addWidget(self.table)
         self.resize(self.table.total_width, QApplication.primaryScreen().availableGeometry().height())
         self.setLayout(layout)
 
+    def finish_startup(self):
+        """Work which is not needed for the first paint: search index, data file watching and recipe table for
+        faster next start"""
+        self.proxy.get_search_index()
+        self.data_handler.start_watching()
+        if self.data_handler.recipe_table is None:
+            self.job_runner.submit("build_recipe_table", _build_recipe_table_job)
+
+    @profiled
+    def restore_session(self):
+        """Restores counts and pins saved by session store, in one model reset"""
+        ingredient_names = self.model.ingredient_names
+        rows_dict = {name: row for row, name in enumerate(ingredient_names)}
+        counts_array = array("I", bytes(4 * len(ingredient_names)))
+        for name, count in self.session_store.ingredient_counts_dict.items():
+            row = rows_dict.get(name)
+            if row is not None and count > 0:
+                counts_array[row] = count
+                self.recipe_set.update_count(name, count)
+        self.pin_registry.set_rows(rows_dict[name] for name in self.session_store.pinned_ingredients_list
+                                   if name in rows_dict)
+        self.model.reset_data(ingredient_names, counts_array, self.locale_table.ingredient_names)
+        if self.model.owned_ingredients_dict:
+            self.job_runner.submit("brew_plan", _plan_brews_job, dict(self.model.owned_ingredients_dict))
+
+    @staticmethod
+    def load_locale_table(locale):
+        """Returns display names of locale, English ones if its catalog cannot be read"""
+        try:
+            return get_locale_table(locale)
+        except (OSError, ValueError):
+            return get_locale_table(DEFAULT_LOCALE)
+
+    def set_locale(self, locale):
+        """Switches display language, only names and search index are swapped, recipes are not recomputed"""
+        self.locale_table = self.load_locale_table(locale)
+        self.session_store.set_setting("translation", self.locale_table.locale)
+        self.model.set_display_names(self.locale_table.ingredient_names)
+        self.proxy.reset_search_index()
+        self.table.update_column_widths()
+
+    def create_search_index(self) -> SearchIndex:
+        """Returns search index of translated names and effects, every locale gets its own index built once"""
+        locale_table = self.locale_table
+        search_index = self.search_indexes_dict.get(locale_table.locale)
+        if search_index is None:
+            effect_index = self.data_handler.effect_index
+            keywords_per_row = []
+            for ingredient in effect_index.ingredients:
+                keywords = [locale_table.effect_names[i] for i in effect_index.mask_to_ids(ingredient.effects_mask)]
+                # English names stay searchable in translated index
+                if locale_table.locale != DEFAULT_LOCALE:
+                    keywords.append(ingredient.name)
+                keywords_per_row.append(keywords)
+            search_index = SearchIndex(locale_table.ingredient_names, keywords_per_row)
+            self.search_indexes_dict[locale_table.locale] = search_index
+        return search_index
+
+    def choose_inventory_file(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Import inventory", "",
+                                                   "Inventory exports (*.txt *.csv *.jsonl);;All files (*)")
+        if file_path:
+            self.import_inventory_file(file_path)
+
+    def import_inventory_file(self, file_path):
+        """Replaces counts with counts read from inventory export, reporting items which are not ingredients"""
+        try:
+            inventory_import = import_inventory(file_path)
+            self.import_counts(inventory_import.counts_dict, replace=True)
+        except (OSError, ValueError, UnicodeDecodeError) as exception:
+            QMessageBox.warning(self, "Import inventory", str(exception))
+            return
+        if inventory_import.unmatched_names_list:
+            QMessageBox.information(self, "Import inventory",
+                                    f"{inventory_import.unmatched_items_count} items are not ingredients: "
+                                    + ", ".join(inventory_import.unmatched_names_list))
+
+    def import_counts(self, counts_dict: dict, replace=False) -> dict:
+        """Applies counts of a whole inventory at once, recipes and brew plan are recomputed once"""
+        return self.model.set_counts(counts_dict, replace)
+
     def get_owned_ingredients_dict(self) -> dict:
         return self.model.owned_ingredients_dict
 
+    @profiled
+    def update_recipe_set(self, ingredient, count):
+        self.recipe_set.update_count(ingredient, count)
+        # planning runs in background, a newer click cancels the stale plan
+        self.job_runner.submit("brew_plan", _plan_brews_job, dict(self.model.owned_ingredients_dict))
+
+    @profiled
+    def update_recipe_set_counts(self, counts_dict):
+        for ingredient, count in counts_dict.items():
+            self.recipe_set.update_count(ingredient, count)
+        self.job_runner.submit("brew_plan", _plan_brews_job, dict(self.model.owned_ingredients_dict))
+
+    def on_job_result(self, key, result):
+        if key == "brew_plan":
+            self.brew_plan = result
+            self.brew_plan_changed.emit(result)
+
+    def closeEvent(self, event):
+        DataHandler.remove_reload_listener(self._reload_listener)
+        self.job_runner.shutdown()
+        self.session_store.close()
+        super().closeEvent(event)
+
+    @profiled
+    def on_data_reloaded(self):
+        ingredient_names = self.data_handler.effect_index.ingredients_list
+        rows_dict = {name: row for row, name in enumerate(ingredient_names)}
+        counts_array = array("I", bytes(4 * len(ingredient_names)))
+        for name, count in zip(self.model.ingredient_names, self.model.counts_array):
+            if count and name in rows_dict:
+                counts_array[rows_dict[name]] = count
+        pinned_ingredients = [self.model.ingredient_names[row] for row in self.pin_registry]
+        self.pin_registry.set_rows(rows_dict[name] for name in pinned_ingredients if name in rows_dict)
+        self.locale_table = self.load_locale_table(self.locale_table.locale)
+        self.search_indexes_dict.clear()
+        self.model.reset_data(ingredient_names, counts_array, self.locale_table.ingredient_names)
+        self.proxy.reset_search_index()
+        self.recipe_set.reload_snapshot()
+
 if __name__ == '__main__':
     app = QApplication([])
     window = IngredientTableFrame()
@@ -1,187 +1,183 @@
-from PySide6.QtGui import QFontMetrics, QColor
-from PySide6.QtWidgets import QStyledItemDelegate, QSpinBox, QTableView, QApplication, QWidget, QVBoxLayout, QLineEdit
+import itertools
+from PySide6.QtWidgets import QTableView, QApplication, QWidget, QVBoxLayout, QLineEdit, QAbstractItemView
 from DataHandler import DataHandler
-from PySide6.QtCore import QAbstractTableModel, Qt, QSortFilterProxyModel
+from PySide6.QtCore import QAbstractTableModel, Qt, QModelIndex
+from GUI.QtJobRunner import QtJobRunner
+from JobRunner import iter_chunks
+from RecipeStream import iter_sorted_recipes, SORT_BY_INGREDIENTS, SORT_BY_EFFECTS_COUNT
+from Translations import DEFAULT_LOCALE, get_locale_table
+from Profiling import profiled
 
 
-class IngredientsTableModel(QAbstractTableModel):
-    def __init__(self, data_list: list, pinned_rows_list: list):
-        super().__init__()
-        self.data_list: list = data_list
-        self.pinned_rows_list: list = pinned_rows_list
-        self.owned_ingredients_dict: dict = {}
+def _fetch_rows_job(recipes_iterator, rows_count, chunk_size):
+    """Pulls next rows_count recipes of stream in chunks, the job is cancelled between chunks"""
+    return iter_chunks(itertools.islice(recipes_iterator, rows_count), chunk_size)
+
 
-    def rowCount(self, index=None):
-        return len(self.data_list)
+class PotionsTableModel(QAbstractTableModel):
+    """Recipes of selected ingredients pulled lazily from a sorted and filtered recipe stream. Rows are fetched in
+    batches as the view scrolls, and sorting or filtering restarts the stream instead of going through a proxy.
+    The stream is advanced in a background job, so the GUI thread never waits for enumeration; fetched chunks are
+    inserted as they arrive."""
+    _batch_size = 200
+    _chunk_size = 50
+    _sort_keys_list = [SORT_BY_INGREDIENTS, SORT_BY_EFFECTS_COUNT]
 
-    def columnCount(self, index=None):
+    def __init__(self):
+        super().__init__()
+        self.rows_list: list = []
+        self.selected_ingredients_set: set = set()
+        self.sort_key = SORT_BY_INGREDIENTS
+        self.descending = False
+        self.filter_text = ""
+        self.locale = DEFAULT_LOCALE
+        self._effect_index = None
+        self._locale_table = None
+        self._recipes_iterator = None
+        self._fetching = False
+        self._fetched_rows_count = 0
+        self.job_runner = QtJobRunner(parent=self)
+        self.job_runner.partial_result.connect(self._on_rows_fetched)
+        self.job_runner.finished.connect(self._on_fetch_finished)
+        self.job_runner.failed.connect(self._on_fetch_failed)
+
+    def rowCount(self, index=QModelIndex()):
+        return 0 if index.isValid() else len(self.rows_list)
+
+    def columnCount(self, index=QModelIndex()):
         return 2
 
+    @profiled
     def data(self, index, role):
-        if not index.isValid():
+        if not index.isValid() or role != Qt.DisplayRole:
             return None
 
-        value = self.data_list[index.row()][index.column()]
-
-        if role == Qt.DisplayRole or role == Qt.EditRole:
-            return str(value) if index.column() == 0 else value
-        elif role == Qt.BackgroundRole and index.row() in self.pinned_rows_list:
-            return QColor(200, 200, 255)
-
-        return None
+        ingredient_ids, effects_mask = self.rows_list[index.row()]
+        if index.column() == 0:
+            locale_table = self._locale_table
+            return " + ".join(locale_table.ingredient_names[i]
+                              for i in sorted(ingredient_ids, key=locale_table.ingredient_ranks.__getitem__))
+        return ", ".join(self._locale_table.effect_names[i] for i in self._effect_index.mask_to_ids(effects_mask))
 
     def flags(self, index):
         if not index.isValid():
             return Qt.NoItemFlags
-        if index.column() == 1:
-            return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable
         return Qt.ItemIsEnabled | Qt.ItemIsSelectable
 
     def headerData(self, section, orientation, role=Qt.DisplayRole):
         if role == Qt.DisplayRole and orientation == Qt.Horizontal:
-            return ["Ingredient", "Count"][section]
+            return ["Ingredients", "Effects"][section]
         return None
 
-    def setData(self, index, value, role=Qt.EditRole):
-        if role == Qt.EditRole and index.isValid():
-            if value == 0:
-                self.owned_ingredients_dict.pop(self.data_list[index.row()][0], None)
-            else:
-                self.owned_ingredients_dict[self.data_list[index.row()][0]] = value
-
-            self.data_list[index.row()][index.column()] = value
-            self.dataChanged.emit(index, index)
-            return True
-        return False
-
-class IngredientsTableSortFilterProxyModel(QSortFilterProxyModel):
-    def __init__(self, pinned_rows_list: list, parent=None):
-        super().__init__(parent)
-        self.pinned_rows_list: list = pinned_rows_list
-        self.filter_text = ""
-
-    def toggle_pin(self, row):
-        if row in self.pinned_rows_list:
-            self.pinned_rows_list.remove(row)
-        else:
-            self.pinned_rows_list.append(row)
-
-        proxy_index = self.index(row, 0)
-        self.dataChanged.emit(proxy_index, proxy_index)
-        self.invalidate()
-
-    def lessThan(self, left, right):
-
-        left_row = left.row()
-        right_row = right.row()
-
-        if left_row in self.pinned_rows_list:
-            left_row = -self.pinned_rows_list.index(left_row) - 1
-
-        if right_row in self.pinned_rows_list:
-            right_row = -self.pinned_rows_list.index(right_row)- 1
-
-        return left_row > right_row
-
-    def filterAcceptsRow(self, source_row, source_parent):
-        if self.filter_text:
-            index = self.sourceModel().index(source_row, 0, source_parent)
-            name = self.sourceModel().data(index, Qt.DisplayRole).lower()
-            return self.filter_text.lower() in name
-        return True
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._recipes_iterator is not None and not self._fetching
+
+    @profiled
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._fetching = True
+        self._fetched_rows_count = 0
+        self.job_runner.submit("rows", _fetch_rows_job, self._recipes_iterator, PotionsTableModel._batch_size,
+                               PotionsTableModel._chunk_size)
+
+    def _on_rows_fetched(self, key, rows):
+        self._fetched_rows_count += len(rows)
+        # the last chunk of a batch allows next fetch before rows are inserted, so the view can ask for it
+        if self._fetched_rows_count == PotionsTableModel._batch_size:
+            self._fetching = False
+        self.beginInsertRows(QModelIndex(), len(self.rows_list), len(self.rows_list) + len(rows) - 1)
+        self.rows_list.extend(rows)
+        self.endInsertRows()
+
+    def _on_fetch_finished(self, key):
+        if self._fetched_rows_count < PotionsTableModel._batch_size:
+            self._recipes_iterator = None
+        self._fetching = False
+
+    def _on_fetch_failed(self, key, exception):
+        self._recipes_iterator = None
+        self._fetching = False
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_key = PotionsTableModel._sort_keys_list[column]
+        self.descending = order == Qt.DescendingOrder
+        self.restart()
+
+    def set_selected_ingredients(self, selected_ingredients):
+        self.selected_ingredients_set = set(selected_ingredients)
+        self.restart()
 
     def setFilterText(self, text):
         self.filter_text = text
-        self.invalidateFilter()
-
-class SpinBoxDelegate(QStyledItemDelegate):
-
-    def createEditor(self, parent, option, index):
-        if index.column() == 1:
-            spinbox = QSpinBox(parent)
-            spinbox.setMinimum(0)
-            spinbox.setMaximum(1000000)
-            return spinbox
-        return super().createEditor(parent, option, index)
+        self.restart()
 
-    def setEditorData(self, editor, index):
-        if index.column() == 1:
-            value = index.model().data(index, Qt.EditRole)
-            editor.setValue(value)
-
-    def setModelData(self, editor, model, index):
-        if index.column() == 1:
-            model.setData(index, editor.value(), Qt.EditRole)
-
-class IngredientTableView(QTableView):
+    def set_locale(self, locale):
+        """Switches display language; with a filter the matching recipes differ, so only then the stream restarts"""
+        self.locale = locale
+        if self.filter_text.strip():
+            self.restart()
+        else:
+            self._locale_table = get_locale_table(locale)
+            if self.rows_list:
+                self.dataChanged.emit(self.index(0, 0), self.index(len(self.rows_list) - 1, 1), [Qt.DisplayRole])
+
+    @profiled
+    def restart(self):
+        """Drops fetched rows and starts new recipe stream, rows are then fetched on demand by the view"""
+        self.job_runner.cancel("rows")
+        self.beginResetModel()
+        self.rows_list = []
+        self._fetching = False
+        self._effect_index = DataHandler().snapshot.effect_index
+        self._locale_table = get_locale_table(self.locale)
+        self._recipes_iterator = iter_sorted_recipes(self.selected_ingredients_set, self.sort_key, self.descending,
+                                                     self.filter_text, locale=self.locale)
+        self.endResetModel()
+
+
+class PotionsTableView(QTableView):
     def __init__(self, model):
         super().__init__()
         self.model = model
         self.setModel(model)
-        self.setItemDelegateForColumn(1, SpinBoxDelegate())
+        self.setSortingEnabled(True)
+        self.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.horizontalHeader().setStretchLastSection(True)
         self.verticalHeader().setVisible(False)
-        max_ingredient_string_width = max(
-            QFontMetrics(self.font()).horizontalAdvance(item[0]) for item in self.model.sourceModel().data_list) + 10
-        self.setColumnWidth(0, max_ingredient_string_width)
-        three_digit_string_width = QFontMetrics(self.font()).horizontalAdvance("999") + 20
-        self.setColumnWidth(1, three_digit_string_width)
-        self.total_width = max_ingredient_string_width + three_digit_string_width + 50
-
-    def mousePressEvent(self, event):
-        index = self.indexAt(event.position().toPoint())
-        if not index.isValid():
-            return super().mousePressEvent(event)
 
-        if event.button() == Qt.MiddleButton: # pin row
-            source_row_number = self.model.mapToSource(self.model.index(index.row(), 1)).row()
-            self.model.toggle_pin(source_row_number)
 
-        elif event.button() == Qt.LeftButton: # increase count
-            source_index = self.model.mapToSource(self.model.index(index.row(), 1))
-            current_value = self.model.sourceModel().data(source_index, Qt.DisplayRole) or 0
-            self.model.sourceModel().setData(source_index, int(current_value) + 1, Qt.EditRole)
-
-        elif event.button() == Qt.RightButton: # decrease count
-            source_index = self.model.mapToSource(self.model.index(index.row(), 1))
-            current_value = self.model.sourceModel().data(source_index, Qt.DisplayRole) or 0
-            if current_value == 0:
-                return None
-            self.model.sourceModel().setData(source_index, int(current_value) - 1, Qt.EditRole)
-
-        super().mousePressEvent(event)
-
-class IngredientTableFrame(QWidget):
+class PotionsTableFrame(QWidget):
 
     def __init__(self):
         super().__init__()
-        self.data_handler = DataHandler()
-        self.pinned_rows_list = []
-        input_data = [[ingredient, 0] for ingredient in sorted(self.data_handler.ingredients_set)]
-        self.model = IngredientsTableModel(input_data, self.pinned_rows_list)
-
-        self.proxy = IngredientsTableSortFilterProxyModel(self.pinned_rows_list)
-        self.proxy.setSourceModel(self.model)
-        self.proxy.setSortRole(Qt.DisplayRole)
-
-        self.table = IngredientTableView(self.proxy)
-        self.table.setSortingEnabled(True)
+        self.model = PotionsTableModel()
+        self.table = PotionsTableView(self.model)
 
         self.search_box = QLineEdit()
-        self.search_box.setPlaceholderText("Type name of ingredient...")
-        self.search_box.textChanged.connect(self.proxy.setFilterText)
+        self.search_box.setPlaceholderText("Type name of ingredient or effect...")
+        self.search_box.textChanged.connect(self.model.setFilterText)
 
         layout = QVBoxLayout()
         layout.addWidget(self.search_box)
         layout.addWidget(self.table)
-        self.resize(self.table.total_width, QApplication.primaryScreen().availableGeometry().height())
         self.setLayout(layout)
 
-    def get_owned_ingredients_dict(self) -> dict:
-        return self.model.owned_ingredients_dict
+    def set_selected_ingredients(self, selected_ingredients):
+        self.model.set_selected_ingredients(selected_ingredients)
+
+    def set_locale(self, locale):
+        self.model.set_locale(locale)
+
+    def closeEvent(self, event):
+        self.model.job_runner.shutdown()
+        super().closeEvent(event)
+
 
 if __name__ == '__main__':
     app = QApplication([])
-    window = IngredientTableFrame()
+    window = PotionsTableFrame()
+    window.set_selected_ingredients(DataHandler().ingredients_set)
+    window.resize(900, QApplication.primaryScreen().availableGeometry().height())
     window.show()
-    app.exec()
\ No newline at end of file
+    app.exec()
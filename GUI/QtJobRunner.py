@@ -0,0 +1,45 @@
+from PySide6.QtCore import QObject, Signal
+from JobRunner import JobRunner
+
+
+class QtJobRunner(QObject):
+    """JobRunner which delivers results in the GUI thread. Worker threads emit private signals, which Qt queues to
+    the thread of this object; results of jobs that became stale in the meantime are dropped there."""
+    partial_result = Signal(str, object)
+    finished = Signal(str)
+    failed = Signal(str, object)
+    _worker_partial_result = Signal(str, int, object)
+    _worker_finished = Signal(str, int)
+    _worker_failed = Signal(str, int, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._runner = JobRunner()
+        self._worker_partial_result.connect(self._on_partial_result)
+        self._worker_finished.connect(self._on_finished)
+        self._worker_failed.connect(self._on_failed)
+
+    def submit(self, key: str, job_function, *args):
+        """Starts job_function(*args) returning iterable of partial results, cancelling previous job with key"""
+        self._runner.submit(key, job_function, *args,
+                            on_partial=lambda job_id, result: self._worker_partial_result.emit(key, job_id, result),
+                            on_finished=lambda job_id: self._worker_finished.emit(key, job_id),
+                            on_error=lambda job_id, exception: self._worker_failed.emit(key, job_id, exception))
+
+    def cancel(self, key: str):
+        self._runner.cancel(key)
+
+    def shutdown(self):
+        self._runner.shutdown()
+
+    def _on_partial_result(self, key, job_id, result):
+        if self._runner.is_current(key, job_id):
+            self.partial_result.emit(key, result)
+
+    def _on_finished(self, key, job_id):
+        if self._runner.is_current(key, job_id):
+            self.finished.emit(key)
+
+    def _on_failed(self, key, job_id, exception):
+        if self._runner.is_current(key, job_id):
+            self.failed.emit(key, exception)
@@ -0,0 +1,189 @@
+"""Imports ingredient counts from inventory exports. The file is read line by line and only counts per ingredient
+are kept, so memory does not grow with the size of the export. Supported formats (see
+docs/inventory_export_example.txt):
+
+    text   one item per line: "Wheat x 12", "12 Wheat", "Wheat: 12" or "Wheat<tab>12" (count 1 if missing)
+    csv    columns name,count (header optional, columns item/quantity are accepted too)
+    jsonl  one item per line: {"name": "Wheat", "count": 12}
+
+Item names are matched to ingredients ignoring case, accents and punctuation, also in translated names, and
+misspelled names are matched to the closest ingredient name. Matches are cached per item name. A count which is not
+a whole number from 1 to MAX_COUNT raises ValueError with its line number.
+"""
+import csv
+import difflib
+import itertools
+import json
+import os
+import re
+import sys
+from DataHandler import DataHandler
+from LRUCache import LRUCache
+from Profiling import profiled
+from SearchIndex import fold_text
+from Translations import get_available_locales, get_locale_table
+
+_TEXT_LINE_PATTERNS = (re.compile(r"^(?P<name>.+?)\s*(?:x|\*|:|\t|,)\s*(?P<count>\d+)$", re.IGNORECASE),
+                       re.compile(r"^(?P<count>\d+)\s*(?:x\s+)?(?P<name>.+)$", re.IGNORECASE))
+_NAME_COLUMNS = ("name", "item", "ingredient")
+_COUNT_COLUMNS = ("count", "quantity", "amount")
+# counts are kept in array("I") of the ingredients model and edited in a QSpinBox, which holds signed 32-bit values
+MAX_COUNT = 2 ** 31 - 1
+
+_name_matchers_list = []
+DataHandler.add_reload_listener(_name_matchers_list.clear)
+
+
+def normalize_name(name: str) -> str:
+    """Returns folded name without punctuation and repeated spaces"""
+    return " ".join(re.sub(r"[^\w\s]", "", fold_text(name)).split())
+
+
+class NameMatcher:
+    """Maps item names to ingredient names of current data, English or translated"""
+
+    def __init__(self, cutoff=0.85):
+        self.cutoff = cutoff
+        self._ingredients_dict: dict = {}
+        self.effect_index = effect_index = DataHandler().effect_index
+        for locale in get_available_locales():
+            try:
+                locale_table = get_locale_table(locale)
+            except (OSError, ValueError):
+                continue
+            for ingredient, name in zip(effect_index.ingredients_list, locale_table.ingredient_names):
+                self._ingredients_dict.setdefault(normalize_name(name), ingredient)
+        self._normalized_names: list = list(self._ingredients_dict)
+        self._matches_cache = LRUCache(max_size=4096)
+
+    def match(self, item_name: str):
+        """Returns ingredient name matching item name, or None if it is not an ingredient"""
+        return self._matches_cache.get_or_compute(item_name, lambda: self._match(item_name))
+
+    def _match(self, item_name):
+        normalized_name = normalize_name(item_name)
+        ingredient = self._ingredients_dict.get(normalized_name)
+        if ingredient is None:
+            close_names = difflib.get_close_matches(normalized_name, self._normalized_names, 1, self.cutoff)
+            if close_names:
+                ingredient = self._ingredients_dict[close_names[0]]
+        return ingredient
+
+
+def get_name_matcher() -> NameMatcher:
+    """Returns name matcher of current data, kept until data is reloaded"""
+    if not _name_matchers_list or _name_matchers_list[0].effect_index is not DataHandler().effect_index:
+        _name_matchers_list[:] = [NameMatcher()]
+    return _name_matchers_list[0]
+
+
+class InventoryImport:
+    """Result of an import: counts per ingredient, number of read items, and names which matched no ingredient
+    (at most max_unmatched_names of them are kept)"""
+    max_unmatched_names = 100
+
+    def __init__(self):
+        self.counts_dict: dict = {}
+        self.items_count = 0
+        self.unmatched_items_count = 0
+        self.unmatched_names_list: list = []
+
+    def add_item(self, ingredient, item_name, count):
+        self.items_count += 1
+        if ingredient is None:
+            self.unmatched_items_count += 1
+            if len(self.unmatched_names_list) < InventoryImport.max_unmatched_names \
+                    and item_name not in self.unmatched_names_list:
+                self.unmatched_names_list.append(item_name)
+        else:
+            self.counts_dict[ingredient] = min(self.counts_dict.get(ingredient, 0) + count, MAX_COUNT)
+
+
+def parse_count(value, line_number) -> int:
+    """Returns count of an item, raises ValueError if it is not a whole number from 1 to MAX_COUNT"""
+    try:
+        count = int(value)
+    except (ValueError, TypeError) as exception:
+        raise ValueError(f"Invalid count on line {line_number}: {exception}") from exception
+    if not 1 <= count <= MAX_COUNT:
+        raise ValueError(f"Invalid count on line {line_number}: {count} is not between 1 and {MAX_COUNT}")
+    return count
+
+
+def iter_text_items(lines):
+    """Yields (item name, count) of text export lines, blank lines and lines starting with # are skipped"""
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        for pattern in _TEXT_LINE_PATTERNS:
+            match = pattern.match(line)
+            if match:
+                yield match["name"].strip(), parse_count(match["count"], line_number)
+                break
+        else:
+            yield line, 1
+
+
+def iter_csv_items(lines):
+    """Yields (item name, count) of CSV export rows"""
+    rows = reader = csv.reader(lines)
+    first_row = next(rows, None)
+    if first_row is None:
+        return
+    header = [column.strip().casefold() for column in first_row]
+    name_column = next((header.index(column) for column in _NAME_COLUMNS if column in header), None)
+    count_column = next((header.index(column) for column in _COUNT_COLUMNS if column in header), None)
+    if name_column is None:
+        name_column, count_column = 0, 1
+        rows = itertools.chain([first_row], rows)
+    for row in rows:
+        if len(row) > name_column and row[name_column].strip():
+            count = row[count_column].strip() if count_column is not None and len(row) > count_column else ""
+            yield row[name_column].strip(), parse_count(count, reader.line_num) if count else 1
+
+
+def iter_jsonl_items(lines):
+    """Yields (item name, count) of JSON lines export"""
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            item_name, count = item["name"], item.get("count", 1)
+        except (ValueError, KeyError, TypeError, AttributeError) as exception:
+            raise ValueError(f"Invalid item on line {line_number}: {exception}") from exception
+        yield item_name, parse_count(count, line_number)
+
+
+_ITEM_READERS_DICT = {"text": iter_text_items, "csv": iter_csv_items, "jsonl": iter_jsonl_items}
+
+
+def get_file_format(file_path) -> str:
+    """Returns format of export guessed from file extension, text for unknown extensions"""
+    extension = os.path.splitext(file_path)[1].casefold()
+    return {".csv": "csv", ".jsonl": "jsonl"}.get(extension, "text")
+
+
+@profiled
+def import_inventory_lines(lines, file_format="text") -> InventoryImport:
+    """Returns InventoryImport of iterable of export lines"""
+    if file_format not in _ITEM_READERS_DICT:
+        raise ValueError(f"Unknown inventory format {file_format}.")
+    name_matcher = get_name_matcher()
+    inventory_import = InventoryImport()
+    for item_name, count in _ITEM_READERS_DICT[file_format](lines):
+        inventory_import.add_item(name_matcher.match(item_name), item_name, count)
+    return inventory_import
+
+
+def import_inventory(file_path, file_format=None) -> InventoryImport:
+    """Returns InventoryImport of export file, format is guessed from extension if not given"""
+    with open(file_path, "r", encoding="utf-8-sig", newline="") as f:
+        return import_inventory_lines(f, file_format or get_file_format(file_path))
+
+
+if __name__ == '__main__':
+    result = import_inventory(sys.argv[1] if len(sys.argv) > 1 else "docs/inventory_export_example.txt")
+    print(result.counts_dict)
+    print(f"{result.items_count} items, unmatched: {result.unmatched_names_list}")
@@ -0,0 +1,97 @@
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def iter_chunks(iterable, chunk_size=500):
+    """Yields lists of at most chunk_size consecutive items of iterable"""
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
+
+
+class Job:
+    def __init__(self, job_id: int, key):
+        self.id = job_id
+        self.key = key
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+
+class JobRunner:
+    """Runs computations in worker threads. A job function returns an iterable of partial results (e.g. chunks of
+    recipes from iter_chunks), which are passed to on_partial as they come. Submitting a job cancels the running job
+    with the same key, since its result is stale; cancellation is checked between partial results, so long jobs
+    should yield often.
+
+    Every key has a single worker thread: a stale job stops at its next partial result before the newer one starts,
+    jobs waiting behind it are skipped once cancelled, and jobs of one key may share a generator (e.g. a recipe
+    stream pulled batch by batch) without advancing it from two threads. Jobs of different keys run in parallel.
+
+    Callbacks are called in worker threads, GUI code should pass them on through queued signals."""
+
+    def __init__(self):
+        self._executors_dict: dict = {}
+        self._jobs_dict: dict = {}
+        self._lock = threading.Lock()
+        self._job_ids = itertools.count(1)
+
+    def submit(self, key, job_function, *args, on_partial=None, on_finished=None, on_error=None) -> int:
+        """Starts job_function(*args) and returns job id passed to callbacks: on_partial(job_id, partial_result),
+        on_finished(job_id) and on_error(job_id, exception). Cancelled jobs call no callbacks after cancellation."""
+        with self._lock:
+            previous_job = self._jobs_dict.get(key)
+            if previous_job is not None:
+                previous_job.cancel()
+            job = Job(next(self._job_ids), key)
+            self._jobs_dict[key] = job
+            executor = self._executors_dict.get(key)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"JobRunner-{key}")
+                self._executors_dict[key] = executor
+        executor.submit(self._run, job, job_function, args, on_partial, on_finished, on_error)
+        return job.id
+
+    def cancel(self, key):
+        with self._lock:
+            job = self._jobs_dict.pop(key, None)
+        if job is not None:
+            job.cancel()
+
+    def is_current(self, key, job_id) -> bool:
+        """Returns True if job_id is the latest job submitted with key and it was not cancelled"""
+        job = self._jobs_dict.get(key)
+        return job is not None and job.id == job_id and not job.is_cancelled()
+
+    def shutdown(self):
+        with self._lock:
+            for job in self._jobs_dict.values():
+                job.cancel()
+            self._jobs_dict.clear()
+            executors = list(self._executors_dict.values())
+            self._executors_dict.clear()
+        for executor in executors:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _run(self, job: Job, job_function, args, on_partial, on_finished, on_error):
+        if job.is_cancelled():
+            return
+        try:
+            partial_results = job_function(*args)
+            for partial_result in partial_results:
+                if job.is_cancelled():
+                    getattr(partial_results, "close", lambda: None)()
+                    return
+                if on_partial is not None:
+                    on_partial(job.id, partial_result)
+        except Exception as exception:
+            if on_error is not None and not job.is_cancelled():
+                on_error(job.id, exception)
+            return
+        if on_finished is not None and not job.is_cancelled():
+            on_finished(job.id)
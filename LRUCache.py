@@ -0,0 +1,60 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Bounded least recently used cache with hit/miss/eviction counters"""
+    _missing = object()
+
+    def __init__(self, max_size=1024):
+        self._items = OrderedDict()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get_or_compute(self, key, compute_function):
+        """Returns cached value of key, calling compute_function() and storing its result on miss"""
+        value = self._items.get(key, LRUCache._missing)
+        if value is not LRUCache._missing:
+            self.hits += 1
+            self._items.move_to_end(key)
+            return value
+        self.misses += 1
+        value = compute_function()
+        self._items[key] = value
+        self._evict()
+        return value
+
+    def get(self, key, default=None):
+        """Returns cached value of key, default on miss"""
+        value = self._items.get(key, LRUCache._missing)
+        if value is LRUCache._missing:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        self._evict()
+
+    def set_max_size(self, max_size):
+        self.max_size = max_size
+        self._evict()
+
+    def clear(self):
+        self._items.clear()
+
+    def get_stats(self) -> dict:
+        return {"size": len(self._items), "max_size": self.max_size, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
+
+    def _evict(self):
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+            self.evictions += 1
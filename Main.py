@@ -1,5 +1,67 @@
-from DataHandler import DataHandler
+import sys
+import time
+
+
+class StartupTimer:
+    """Collects duration of startup phases, printed to stderr when enabled"""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.start_time = time.perf_counter()
+        self.last_time = self.start_time
+        self.phases_list: list = []
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        duration = now - self.last_time
+        self.phases_list.append((phase, duration))
+        self.last_time = now
+        if self.enabled:
+            print(f"[startup] {phase}: {duration * 1000:.1f} ms (total {(now - self.start_time) * 1000:.1f} ms)",
+                  file=sys.stderr)
+
+
+def _get_option_value(argv, option):
+    """Returns value following option in argv, None if option is not given"""
+    if option in argv and argv.index(option) + 1 < len(argv):
+        return argv[argv.index(option) + 1]
+    return None
+
+
+def main(argv):
+    timer = StartupTimer("--startup-timing" in argv)
+    # instrumentation is decided when instrumented modules are imported, so it is enabled first
+    report_path = _get_option_value(argv, "--profile")
+    samples_path = _get_option_value(argv, "--profile-samples")
+    if report_path or samples_path:
+        import Profiling
+        Profiling.enable(report_path, samples_path)
+    # PySide6 and GUI modules are imported only here, so importing Main or the core stays cheap
+    from PySide6.QtCore import QTimer
+    from PySide6.QtWidgets import QApplication
+    timer.mark("import PySide6")
+    app = QApplication(argv)
+    timer.mark("create application")
+
+    from DataHandler import DataHandler
+    DataHandler()
+    timer.mark("load data")
+    from GUI.IngredientsFrame import IngredientTableFrame
+    timer.mark("import GUI")
+    window = IngredientTableFrame()
+    timer.mark("create window")
+    window.show()
+    timer.mark("show window")
+
+    def after_first_paint():
+        timer.mark("first paint")
+        window.finish_startup()
+        timer.mark("deferred startup work")
+
+    # zero timeout runs after pending paint events are processed
+    QTimer.singleShot(0, after_first_paint)
+    return app.exec()
+
 
 if __name__ == "__main__":
-    data_handler = DataHandler()
-    GUI(data_handler)
\ No newline at end of file
+    sys.exit(main(sys.argv))
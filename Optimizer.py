@@ -0,0 +1,204 @@
+import heapq
+from operator import itemgetter
+from DataHandler import DataHandler
+from LRUCache import LRUCache
+from Profiling import profiled
+from QueryClient import served
+
+OBJECTIVE_POTIONS = "potions"
+OBJECTIVE_VALUE = "value"
+# recipes of highest value kept for every ingredient, the only ones scored when counts change
+CANDIDATES_PER_INGREDIENT = 32
+
+
+def count_effects_value(ingredient_ids, effects_mask):
+    """Default value of a potion: number of its effects"""
+    return effects_mask.bit_count()
+
+
+def _count_potion(ingredient_ids, effects_mask):
+    return 1
+
+
+@profiled
+@served(lambda result: [(tuple(ingredients), times) for ingredients, times in result])
+def plan_brews(owned_ingredients_dict: dict, objective=OBJECTIVE_POTIONS, value_function=None,
+               max_ingredients_count=3) -> list:
+    """Returns list of brews (tuple of ingredients, number of potions) that maximizes number of potions or their
+    total value without using more ingredients than owned.
+
+    Candidates are the CANDIDATES_PER_INGREDIENT most valuable recipes of every ingredient. They are brewed
+    greedily, best value per scarce ingredient first, where scarcity of an ingredient is the number of owned
+    candidates using it divided by its owned count, then recipes of the ingredients left, best value first. Then a
+    lookahead pass splits brewed pairs (a, b) into (a, x) and (b, y) using leftover ingredients x and y whenever
+    that increases the objective. When maximizing number of potions, triples are only brewed from ingredients left after that.
+    value_function(ingredient_ids, effects_mask) is used for OBJECTIVE_VALUE, count_effects_value if None."""
+    if objective == OBJECTIVE_POTIONS:
+        value_function = _count_potion
+    elif objective == OBJECTIVE_VALUE:
+        value_function = value_function or count_effects_value
+    else:
+        raise ValueError(f"Unknown objective {objective}.")
+
+    snapshot = DataHandler().snapshot
+    effect_index = snapshot.effect_index
+    counts = [0] * len(effect_index.ingredients_list)
+    for ingredient, count in owned_ingredients_dict.items():
+        ingredient_id = effect_index.ingredient_ids_dict.get(ingredient)
+        if ingredient_id is not None and count > 0:
+            counts[ingredient_id] = count
+
+    # triples use more ingredients per potion, so for number of potions they only serve leftovers
+    first_max_ingredients_count = 2 if objective == OBJECTIVE_POTIONS else max_ingredients_count
+    recipes, values, positions_lists = _get_candidates(snapshot, value_function, first_max_ingredients_count)
+    brews_dict = {}
+    _brew_greedily(_iter_brewing_order(recipes, values, positions_lists, counts), recipes, brews_dict, counts)
+    _brew_leftovers(snapshot, brews_dict, counts, value_function, first_max_ingredients_count)
+    _split_pairs(effect_index, brews_dict, counts, value_function)
+    if objective == OBJECTIVE_POTIONS and max_ingredients_count >= 3:
+        _brew_leftovers(snapshot, brews_dict, counts, value_function, max_ingredients_count)
+
+    ingredients_list = effect_index.ingredients_list
+    return [(tuple(ingredients_list[i] for i in ingredient_ids), times)
+            for ingredient_ids, times in brews_dict.items() if times > 0]
+
+
+_candidates_cache = LRUCache(max_size=4)
+DataHandler.add_reload_listener(_candidates_cache.clear)
+
+
+def _get_candidates(snapshot, value_function, max_ingredients_count):
+    """Returns list of ingredient ids of the best recipes of every ingredient, list of their values and, for every
+    ingredient, positions of its best recipes in these lists. Candidates are kept per snapshot and value function,
+    so changing owned counts only scores the candidates of owned ingredients."""
+    key = (snapshot.effect_index, value_function, max_ingredients_count)
+    return _candidates_cache.get_or_compute(
+        key, lambda: _find_candidates(snapshot, value_function, max_ingredients_count))
+
+
+def _find_candidates(snapshot, value_function, max_ingredients_count):
+    effect_index = snapshot.effect_index
+    all_mask = (1 << len(effect_index.ingredients_list)) - 1
+    scored_recipes = []
+    for ingredient_ids, effects_mask in snapshot.get_recipes_source(all_mask).iter_recipes(
+            all_mask, max_ingredients_count):
+        value = value_function(ingredient_ids, effects_mask)
+        if value > 0:
+            scored_recipes.append((value, ingredient_ids))
+    scored_recipes.sort(key=itemgetter(0), reverse=True)
+
+    recipes = []
+    values = []
+    positions_lists = [[] for _ in effect_index.ingredients_list]
+    not_full_count = len(positions_lists)
+    for value, ingredient_ids in scored_recipes:
+        position = len(recipes)
+        is_candidate = False
+        for i in ingredient_ids:
+            positions = positions_lists[i]
+            if len(positions) < CANDIDATES_PER_INGREDIENT:
+                positions.append(position)
+                is_candidate = True
+                if len(positions) == CANDIDATES_PER_INGREDIENT:
+                    not_full_count -= 1
+        if is_candidate:
+            recipes.append(ingredient_ids)
+            values.append(value)
+            if not not_full_count:
+                break
+    return recipes, values, positions_lists
+
+
+def _iter_brewing_order(recipes: list, values: list, positions_lists: list, counts: list):
+    """Yields positions of candidates made of owned ingredients by value per scarce ingredient, best first. Scarcity
+    of an ingredient is the number of these candidates using it divided by its owned count. Candidates are popped
+    from a heap, so brewing, which stops when ingredients run out, doesn't sort all of them."""
+    positions = {position for ingredient_id, count in enumerate(counts) if count
+                 for position in positions_lists[ingredient_id] if all(counts[i] for i in recipes[position])}
+    demands = [0] * len(counts)
+    for position in positions:
+        for ingredient_id in recipes[position]:
+            demands[ingredient_id] += 1
+    weights = [demand / count if count else 0 for demand, count in zip(demands, counts)]
+    heap = [(-values[position] / sum(weights[i] for i in recipes[position]), position) for position in positions]
+    heapq.heapify(heap)
+    while heap:
+        yield heapq.heappop(heap)[1]
+
+
+def _brew_leftovers(snapshot, brews_dict: dict, counts: list, value_function, max_ingredients_count):
+    """Brews recipes made only of ingredients left, best value first. Candidates are only the best recipes of every
+    ingredient, so this uses ingredients whose candidates all needed an ingredient which ran out."""
+    leftovers_mask = sum(1 << i for i, count in enumerate(counts) if count > 0)
+    if leftovers_mask.bit_count() < 2:
+        return
+    scored_recipes = []
+    for ingredient_ids, effects_mask in snapshot.get_recipes_source(leftovers_mask).iter_recipes(
+            leftovers_mask, max_ingredients_count):
+        value = value_function(ingredient_ids, effects_mask)
+        if value > 0:
+            scored_recipes.append((value, ingredient_ids))
+    scored_recipes.sort(key=itemgetter(0), reverse=True)
+    _brew_greedily(range(len(scored_recipes)), [ingredient_ids for _, ingredient_ids in scored_recipes],
+                   brews_dict, counts)
+
+
+def _brew_greedily(order, recipes: list, brews_dict: dict, counts: list):
+    """Brews recipes at positions in order, each as many times as remaining counts allow. Every brew uses up at least
+    one ingredient, so most recipes are skipped by a check of their ingredients, and brewing stops when less than
+    two ingredients are left."""
+    ingredients_left_count = sum(1 for count in counts if count > 0)
+    if ingredients_left_count < 2:
+        return
+    for ingredient_ids in map(recipes.__getitem__, order):
+        # for a pair the last id is the second ingredient again
+        if not (counts[ingredient_ids[0]] and counts[ingredient_ids[1]] and counts[ingredient_ids[-1]]):
+            continue
+        times = min(counts[i] for i in ingredient_ids)
+        for i in ingredient_ids:
+            counts[i] -= times
+            if counts[i] == 0:
+                ingredients_left_count -= 1
+        brews_dict[ingredient_ids] = brews_dict.get(ingredient_ids, 0) + times
+        if ingredients_left_count < 2:
+            return
+
+
+def _split_pairs(effect_index, brews_dict: dict, counts: list, value_function):
+    """Replaces brewed pairs (a, b) with pairs (a, x) and (b, y) made with leftover ingredients while it increases
+    total value"""
+    masks = effect_index.ingredient_masks_list
+    improved = True
+    while improved:
+        improved = False
+        leftovers = [i for i, count in enumerate(counts) if count > 0]
+        if not leftovers:
+            return
+        for (a, b), times in [(ids, times) for ids, times in brews_dict.items() if len(ids) == 2 and times > 0]:
+            best = None
+            for x in leftovers:
+                if not masks[a] & masks[x] or x in (a, b):
+                    continue
+                for y in leftovers:
+                    if not masks[b] & masks[y] or y in (a, b) or (x == y and counts[x] < 2):
+                        continue
+                    gain = value_function(tuple(sorted((a, x))), masks[a] & masks[x]) \
+                        + value_function(tuple(sorted((b, y))), masks[b] & masks[y]) \
+                        - value_function((a, b), masks[a] & masks[b])
+                    if gain > 0 and (best is None or gain > best[0]):
+                        best = (gain, x, y)
+            if best is None:
+                continue
+            _, x, y = best
+            split_times = min(times, counts[x] // 2, counts[y] // 2) if x == y else min(times, counts[x], counts[y])
+            if split_times == 0:
+                continue
+            brews_dict[(a, b)] -= split_times
+            counts[a] += split_times
+            counts[b] += split_times
+            for pair in (tuple(sorted((a, x))), tuple(sorted((b, y)))):
+                brews_dict[pair] = brews_dict.get(pair, 0) + split_times
+                for i in pair:
+                    counts[i] -= split_times
+            improved = True
+            break
@@ -0,0 +1,115 @@
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from EffectIndex import EffectIndex
+
+_worker_effect_index = None
+_worker_ingredients_list = None
+
+
+def _mask_words_count(bits_count) -> int:
+    return max(1, (bits_count + 63) // 64)
+
+
+def _init_worker(shared_memory_name, ingredients_count, effects_count, ingredients_list):
+    """Builds effect index of a worker process once from ingredient masks in shared memory"""
+    global _worker_effect_index, _worker_ingredients_list
+    _worker_ingredients_list = ingredients_list
+    words_count = _mask_words_count(effects_count)
+    masks_memory = shared_memory.SharedMemory(name=shared_memory_name)
+    try:
+        words = struct.unpack_from(f"<{ingredients_count * words_count}Q", masks_memory.buf)
+    finally:
+        masks_memory.close()
+    ingredient_masks_list = []
+    for ingredient_id in range(ingredients_count):
+        mask = 0
+        for i in range(words_count):
+            mask |= words[ingredient_id * words_count + i] << (64 * i)
+        ingredient_masks_list.append(mask)
+    _worker_effect_index = EffectIndex.from_ingredient_masks(ingredient_masks_list, effects_count)
+
+
+def _group_shard_by_effect(ingredients_mask, max_ingredients_count, first_ingredients_mask):
+    """Returns dict effect id -> list of combinations of ingredient names of recipes of a shard, so the parent only
+    merges lists per effect. Lists are sent instead of sets, unpickling a set hashes every combination again."""
+    effect_index = _worker_effect_index
+    ingredients_list = _worker_ingredients_list
+    effect_combinations_dict: dict = {}
+    for ingredient_ids, effects_mask in effect_index.iter_recipes(
+            ingredients_mask, max_ingredients_count, first_ingredients_mask):
+        combination = tuple(ingredients_list[i] for i in ingredient_ids)
+        for effect_id in effect_index.mask_to_ids(effects_mask):
+            combinations = effect_combinations_dict.get(effect_id)
+            if combinations is None:
+                effect_combinations_dict[effect_id] = [combination]
+            else:
+                combinations.append(combination)
+    return effect_combinations_dict
+
+
+class ParallelRecipeEnumerator:
+    """Enumerates recipes of an effect index in a process pool. Ingredient masks are put in shared memory once and
+    every worker builds its own index from them at start, so tasks only carry small shard masks. Shards are ranges
+    of first ingredient ids, each worker groups the recipes of its shard by effect."""
+
+    def __init__(self, effect_index: EffectIndex, max_workers=None):
+        self.effect_index = effect_index
+        self.max_workers = max_workers or os.cpu_count() or 1
+        ingredients_count = len(effect_index.ingredients_list)
+        effects_count = len(effect_index.effects_list)
+        words_count = _mask_words_count(effects_count)
+        words = [(mask >> (64 * i)) & 0xFFFFFFFFFFFFFFFF
+                 for mask in effect_index.ingredient_masks_list for i in range(words_count)]
+        self._shared_memory = shared_memory.SharedMemory(create=True, size=max(8, 8 * len(words)))
+        struct.pack_into(f"<{len(words)}Q", self._shared_memory.buf, 0, *words)
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                             initargs=(self._shared_memory.name, ingredients_count, effects_count,
+                                                       effect_index.ingredients_list))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._shared_memory.close()
+        self._shared_memory.unlink()
+
+    def _get_shards(self, ingredients_mask) -> list:
+        """Splits ingredients into ranges of first ingredient ids. Work per first ingredient falls with its id, so
+        there are several shards per worker and the pool balances them."""
+        ingredient_ids = self.effect_index.mask_to_ids(ingredients_mask)
+        shards_count = min(len(ingredient_ids), self.max_workers * 8) or 1
+        shards = []
+        for shard_number in range(shards_count):
+            shard_mask = 0
+            for ingredient_id in ingredient_ids[shard_number * len(ingredient_ids) // shards_count:
+                                                (shard_number + 1) * len(ingredient_ids) // shards_count]:
+                shard_mask |= 1 << ingredient_id
+            shards.append(shard_mask)
+        return shards
+
+    def get_effects_combinations(self, ingredients_mask: int = None, max_ingredients_count: int = 3) -> dict:
+        """Returns dict effect -> set of combinations of ingredient names, like
+        Controller.get_possible_effects_combinations. Workers group their shards by effect and the parent only
+        updates one set per effect and shard."""
+        if ingredients_mask is None:
+            ingredients_mask = (1 << len(self.effect_index.ingredients_list)) - 1
+        effects_list = self.effect_index.effects_list
+        shards = self._get_shards(ingredients_mask)
+        effects_to_ingredients = {}
+        for effect_combinations_dict in self._executor.map(
+                _group_shard_by_effect, [ingredients_mask] * len(shards), [max_ingredients_count] * len(shards),
+                shards):
+            for effect_id, combinations in effect_combinations_dict.items():
+                effect = effects_list[effect_id]
+                effect_combinations = effects_to_ingredients.get(effect)
+                if effect_combinations is None:
+                    effects_to_ingredients[effect] = set(combinations)
+                else:
+                    effect_combinations.update(combinations)
+        return effects_to_ingredients
@@ -0,0 +1,167 @@
+import heapq
+import math
+from DataHandler import DataHandler
+from LRUCache import LRUCache
+from Profiling import profiled
+
+# restore effects are strengthened by the Physician perk
+_RESTORE_EFFECTS = frozenset(("Restore Health", "Restore Magicka", "Restore Stamina"))
+
+_value_models_cache = LRUCache(max_size=16)
+DataHandler.add_reload_listener(_value_models_cache.clear)
+
+
+class Character:
+    """Alchemy skill, perks (percent bonuses and flags) and fortify alchemy enchantments of a player"""
+    __slots__ = ("alchemy_skill", "alchemist_perk", "fortify_alchemy", "physician", "benefactor", "poisoner")
+
+    def __init__(self, alchemy_skill=15, alchemist_perk=0, fortify_alchemy=0, physician=False, benefactor=False,
+                 poisoner=False):
+        self.alchemy_skill = alchemy_skill
+        self.alchemist_perk = alchemist_perk
+        self.fortify_alchemy = fortify_alchemy
+        self.physician = physician
+        self.benefactor = benefactor
+        self.poisoner = poisoner
+
+    def get_key(self) -> tuple:
+        return (self.alchemy_skill, self.alchemist_perk, self.fortify_alchemy, self.physician, self.benefactor,
+                self.poisoner)
+
+    def get_power_factor(self, effect, is_negative) -> float:
+        """Returns multiplier of base magnitude (or duration) of effect brewed by the character"""
+        power_factor = 4 * (1 + self.alchemy_skill / 200) * (1 + self.alchemist_perk / 100) \
+            * (1 + self.fortify_alchemy / 100)
+        if self.physician and effect in _RESTORE_EFFECTS:
+            power_factor *= 1.25
+        if self.benefactor and not is_negative:
+            power_factor *= 1.25
+        if self.poisoner and is_negative:
+            power_factor *= 1.25
+        return power_factor
+
+
+class PotionValueModel:
+    """Magnitude, duration and gold value of potions brewed by a character, compiled for one data snapshot.
+
+    Value of an effect is base_cost * magnitude ** 1.1 * (duration / 10) ** 1.1 (each factor at least 1), where
+    the power factor of the character scales magnitude, or duration for effects without magnitude. Effects missing
+    value fields cost 1, so potions without value data rank by number of effects. An ingredient can multiply
+    magnitude, duration and value of its effects; when several ingredients of a recipe have an effect, the one
+    giving the highest value is used.
+
+    Potion values are memoized per effects bitmask, recipes share few distinct bitmasks, so scoring a batch is one
+    dict lookup per recipe; only recipes with an ingredient having its own multipliers for one of the recipe
+    effects are computed separately."""
+
+    def __init__(self, snapshot, character: Character):
+        self.effect_index = snapshot.effect_index
+        self.character = character
+        effect_index = self.effect_index
+        self._effect_fields_list: list = []
+        self._multipliers_list: list = [{} for _ in effect_index.ingredients_list]
+        self._multiplied_masks_list: list = [0] * len(effect_index.ingredients_list)
+        for effect in effect_index.effects:
+            values_dict = snapshot.alchemy_effects_to_values_dict.get(effect.name, {})
+            power_factor = character.get_power_factor(effect.name, effect.is_negative)
+            self._effect_fields_list.append((values_dict.get("base_magnitude", 0),
+                                             values_dict.get("base_duration", 0), values_dict.get("base_cost", 1),
+                                             power_factor))
+            for ingredient, multipliers_dict in values_dict.get("ingredient_multipliers", {}).items():
+                ingredient_id = effect_index.ingredient_ids_dict.get(ingredient)
+                if ingredient_id is not None:
+                    self._multipliers_list[ingredient_id][effect.id] = multipliers_dict
+                    self._multiplied_masks_list[ingredient_id] |= 1 << effect.id
+        self._multiplied_ingredient_ids = frozenset(ingredient_id for ingredient_id, multiplied_mask
+                                                    in enumerate(self._multiplied_masks_list) if multiplied_mask)
+        self.effect_values_list: list = [self.get_effect(effect.id)[2] for effect in effect_index.effects]
+        self._potion_values_dict: dict = {}
+
+    def get_effect(self, effect_id, multipliers_dict=None) -> tuple:
+        """Returns (magnitude, duration, gold value) of effect brewed with ingredient multipliers"""
+        base_magnitude, base_duration, base_cost, power_factor = self._effect_fields_list[effect_id]
+        if multipliers_dict:
+            base_magnitude *= multipliers_dict.get("magnitude", 1)
+            base_duration *= multipliers_dict.get("duration", 1)
+            base_cost *= multipliers_dict.get("value", 1)
+        if base_magnitude:
+            magnitude, duration = round(base_magnitude * power_factor), base_duration
+        else:
+            magnitude, duration = 0, round(base_duration * power_factor)
+        value = base_cost * max(magnitude, 1) ** 1.1 * max(duration / 10, 1) ** 1.1
+        return magnitude, duration, value
+
+    def get_potion_value(self, effects_mask) -> float:
+        """Returns value of potion with effects_mask and no ingredient multipliers"""
+        value = self._potion_values_dict.get(effects_mask)
+        if value is None:
+            value = math.fsum(self.effect_values_list[effect_id]
+                              for effect_id in self.effect_index.mask_to_ids(effects_mask))
+            self._potion_values_dict[effects_mask] = value
+        return value
+
+    def score(self, ingredient_ids, effects_mask) -> float:
+        """Returns value of recipe, usable as value_function of Optimizer.plan_brews"""
+        multiplied_mask = 0
+        for ingredient_id in ingredient_ids:
+            multiplied_mask |= self._multiplied_masks_list[ingredient_id]
+        if not multiplied_mask & effects_mask:
+            return self.get_potion_value(effects_mask)
+        return math.fsum(self._get_best_effect(ingredient_ids, effect_id)[2]
+                         for effect_id in self.effect_index.mask_to_ids(effects_mask))
+
+    @profiled
+    def score_batch(self, recipes: list) -> list:
+        """Returns values of list of (ingredient ids, effects bitmask)"""
+        for _, effects_mask in recipes:
+            if effects_mask not in self._potion_values_dict:
+                self.get_potion_value(effects_mask)
+        values = list(map(self._potion_values_dict.__getitem__, (effects_mask for _, effects_mask in recipes)))
+        if self._multiplied_ingredient_ids:
+            for recipe_number, (ingredient_ids, effects_mask) in enumerate(recipes):
+                if not self._multiplied_ingredient_ids.isdisjoint(ingredient_ids):
+                    values[recipe_number] = self.score(ingredient_ids, effects_mask)
+        return values
+
+    def get_potion_effects(self, ingredient_ids, effects_mask) -> list:
+        """Returns list of (effect, magnitude, duration, value) of recipe"""
+        return [(self.effect_index.effects_list[effect_id],) + self._get_best_effect(ingredient_ids, effect_id)
+                for effect_id in self.effect_index.mask_to_ids(effects_mask)]
+
+    def _get_best_effect(self, ingredient_ids, effect_id) -> tuple:
+        effect_mask = 1 << effect_id
+        return max((self.get_effect(effect_id, self._multipliers_list[ingredient_id].get(effect_id))
+                    for ingredient_id in ingredient_ids
+                    if self.effect_index.ingredient_masks_list[ingredient_id] & effect_mask),
+                   key=lambda effect: effect[2])
+
+
+def get_value_model(character: Character) -> PotionValueModel:
+    """Returns value model of character for current data, kept for a few characters until data is reloaded"""
+    snapshot = DataHandler().snapshot
+    return _value_models_cache.get_or_compute((snapshot.effect_index, character.get_key()),
+                                              lambda: PotionValueModel(snapshot, character))
+
+
+@profiled
+def rank_recipes(character: Character, selected_ingredients_set=None, limit=100, max_ingredients_count=3) -> list:
+    """Returns list of (value, combination of ingredients, list of (effect, magnitude, duration, value)) of the
+    limit most valuable recipes made of selected ingredients (all ingredients if None), most valuable first"""
+    snapshot = DataHandler().snapshot
+    effect_index = snapshot.effect_index
+    value_model = get_value_model(character)
+    ingredients_mask = None if selected_ingredients_set is None \
+        else effect_index.get_ingredients_mask(selected_ingredients_set)
+    recipes_source = snapshot.get_recipes_source(
+        (1 << len(effect_index.ingredients_list)) - 1 if ingredients_mask is None else ingredients_mask)
+    recipes = list(recipes_source.iter_recipes(ingredients_mask, max_ingredients_count))
+    values = value_model.score_batch(recipes)
+    best_recipe_numbers = heapq.nlargest(limit, range(len(recipes)), key=values.__getitem__)
+    return [(values[recipe_number], tuple(effect_index.ingredients_list[i] for i in recipes[recipe_number][0]),
+             value_model.get_potion_effects(*recipes[recipe_number]))
+            for recipe_number in best_recipe_numbers]
+
+
+if __name__ == '__main__':
+    for value, ingredients, effects in rank_recipes(Character(alchemy_skill=100, alchemist_perk=100), limit=10):
+        print(f"{value:8.1f} {' + '.join(ingredients)}: {effects}")
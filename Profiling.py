@@ -0,0 +1,159 @@
+"""Optional instrumentation of hot paths. Functions decorated with @profiled count calls and wall time when
+profiling is enabled, otherwise the decorator returns the function unchanged, so disabled profiling costs nothing.
+
+Profiling is enabled by environment variables, or by enable() before instrumented modules are imported:
+
+    ALCHEMY_PROFILE=report.json             writes JSON report of calls and times at exit
+    ALCHEMY_PROFILE_SAMPLES=stacks.folded   samples stacks of all threads, written in folded format of
+                                            flamegraph.pl / speedscope at exit
+"""
+import atexit
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+
+_enabled = False
+_stats_dict: dict = {}
+_stats_lock = threading.Lock()
+_sampler = None
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def enable(report_path=None, samples_path=None, sampling_interval=0.005):
+    """Enables profiling of modules imported after the call. Report and folded stacks are written at exit to given
+    paths; stacks are sampled only if samples_path is given."""
+    global _enabled
+    _enabled = True
+    if report_path:
+        atexit.register(write_report, report_path)
+    if samples_path:
+        start_sampling(sampling_interval)
+        atexit.register(write_folded_stacks, samples_path)
+
+
+def profiled(function):
+    """Decorator counting calls and wall time of function. Time of a generator function is the time spent in its
+    iteration, so lazy queries are measured while they are consumed."""
+    if not _enabled:
+        return function
+    name = f"{function.__module__}.{function.__qualname__}"
+
+    if inspect.isgeneratorfunction(function):
+        @functools.wraps(function)
+        def generator_wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            generator = function(*args, **kwargs)
+            elapsed_time = time.perf_counter() - start_time
+            try:
+                while True:
+                    start_time = time.perf_counter()
+                    try:
+                        item = next(generator)
+                    finally:
+                        elapsed_time += time.perf_counter() - start_time
+                    yield item
+            except StopIteration:
+                return
+            finally:
+                generator.close()
+                _record(name, elapsed_time)
+        return generator_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _record(name, time.perf_counter() - start_time)
+    return wrapper
+
+
+def _record(name, elapsed_time):
+    with _stats_lock:
+        stats = _stats_dict.get(name)
+        if stats is None:
+            _stats_dict[name] = [1, elapsed_time, elapsed_time]
+        else:
+            stats[0] += 1
+            stats[1] += elapsed_time
+            if elapsed_time > stats[2]:
+                stats[2] = elapsed_time
+
+
+def get_report() -> dict:
+    """Returns dict name -> {"calls", "total_s", "mean_s", "max_s"}, most time consuming first"""
+    with _stats_lock:
+        items = sorted(_stats_dict.items(), key=lambda item: item[1][1], reverse=True)
+    return {name: {"calls": calls, "total_s": total_time, "mean_s": total_time / calls, "max_s": max_time}
+            for name, (calls, total_time, max_time) in items}
+
+
+def reset():
+    with _stats_lock:
+        _stats_dict.clear()
+    if _sampler is not None:
+        _sampler.clear()
+
+
+def write_report(file_path):
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(get_report(), f, indent=4)
+
+
+class _StackSampler:
+    """Thread sampling stacks of all other threads every interval seconds and counting identical stacks"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stack_counts_dict: dict = {}
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="ProfilingSampler", daemon=True)
+        self._thread.start()
+
+    def _sample(self):
+        sampler_thread_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_thread_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                folded_stack = ";".join(reversed(stack))
+                self.stack_counts_dict[folded_stack] = self.stack_counts_dict.get(folded_stack, 0) + 1
+
+    def clear(self):
+        self.stack_counts_dict = {}
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+
+def start_sampling(interval=0.005):
+    global _sampler
+    if _sampler is None:
+        _sampler = _StackSampler(interval)
+
+
+def write_folded_stacks(file_path):
+    """Writes sampled stacks as lines "frame;frame;frame count", input of flamegraph.pl and speedscope"""
+    if _sampler is None:
+        return
+    with open(file_path, "w", encoding="utf-8") as f:
+        for folded_stack, count in sorted(_sampler.stack_counts_dict.items()):
+            f.write(f"{folded_stack} {count}\n")
+
+
+if os.environ.get("ALCHEMY_PROFILE") or os.environ.get("ALCHEMY_PROFILE_SAMPLES"):
+    enable(os.environ.get("ALCHEMY_PROFILE"), os.environ.get("ALCHEMY_PROFILE_SAMPLES"))
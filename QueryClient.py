@@ -0,0 +1,141 @@
+"""Client of QueryServer. After connect_query_server(address), functions decorated with @served (Controller
+queries and Optimizer.plan_brews) send their calls to the server instead of computing locally, and convert the
+answers back to the types they return locally."""
+import functools
+import inspect
+import itertools
+import json
+import socket
+import threading
+
+_query_client = None
+
+
+def to_json_value(value):
+    """Returns value with sets and tuples turned into lists (sets sorted), so equal queries encode equally"""
+    if isinstance(value, (set, frozenset)):
+        return sorted((to_json_value(item) for item in value), key=json.dumps)
+    if isinstance(value, (list, tuple)):
+        return [to_json_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: to_json_value(item) for key, item in value.items()}
+    return value
+
+
+class QueryServerError(Exception):
+    pass
+
+
+class QueryClient:
+    """Blocking connection to a query server at "host:port" or a Unix socket path, one request at a time. A
+    connection which fails or times out is closed, so a late answer can't be read as the answer of the next request,
+    and the next call connects again."""
+
+    def __init__(self, address, timeout=30.0):
+        self.address = address
+        self.timeout = timeout
+        self._socket = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count(1)
+        self._connect()
+
+    def _connect(self):
+        if ":" in self.address and not self.address.startswith("/"):
+            host, port = self.address.rsplit(":", 1)
+            self._socket = socket.create_connection((host, int(port)), self.timeout)
+        else:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                self._socket.settimeout(self.timeout)
+                self._socket.connect(self.address)
+            except OSError:
+                self._socket.close()
+                self._socket = None
+                raise
+        self._file = self._socket.makefile("rwb")
+
+    def call(self, method, args=(), kwargs=None):
+        """Returns JSON result of method called with args and kwargs on the server. Raises OSError if the server
+        can't be reached or does not answer in time, QueryServerError if it answers with an error."""
+        request = {"method": method, "args": to_json_value(args), "kwargs": to_json_value(kwargs or {})}
+        with self._lock:
+            request["id"] = next(self._request_ids)
+            try:
+                if self._file is None:
+                    self._connect()
+                self._file.write(json.dumps(request).encode("utf-8") + b"\n")
+                self._file.flush()
+                line = self._file.readline()
+                if not line:
+                    raise ConnectionError("Query server closed the connection.")
+                response = json.loads(line)
+                if response.get("id") != request["id"]:
+                    raise ConnectionError(f"Query server answered request {response.get('id')} instead of "
+                                          f"{request['id']}.")
+            except (OSError, ValueError):
+                self._close_connection()
+                raise
+        if "error" in response:
+            raise QueryServerError(response["error"])
+        return response["result"]
+
+    def _close_connection(self):
+        if self._socket is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._socket.close()
+        self._socket = None
+        self._file = None
+
+    def close(self):
+        with self._lock:
+            self._close_connection()
+
+
+def connect_query_server(address, timeout=30.0):
+    """Makes @served functions use query server at address"""
+    global _query_client
+    disconnect_query_server()
+    _query_client = QueryClient(address, timeout)
+
+
+def disconnect_query_server():
+    global _query_client
+    if _query_client is not None:
+        _query_client.close()
+        _query_client = None
+
+
+def served(result_converter=None):
+    """Decorator sending calls of function to the connected query server, if any. result_converter turns JSON
+    result back to the type returned by the local function. Calls with a function argument stay local, and so do
+    calls the server fails to answer (connection lost or timed out); the next call connects again. A generator
+    function stays a generator function, so decorators above it (e.g. Profiling.profiled) see it as one."""
+    def decorator(function):
+        def call(args, kwargs):
+            # functions passed as arguments (e.g. value_function) can't be sent
+            if _query_client is None or any(callable(value) for value in (*args, *kwargs.values())):
+                return function(*args, **kwargs)
+            try:
+                result = _query_client.call(function.__name__, args, kwargs)
+            except (OSError, ValueError):
+                # server unreachable, too slow or answering garbage: the query is answered locally
+                return function(*args, **kwargs)
+            return result if result_converter is None else result_converter(result)
+
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def generator_wrapper(*args, **kwargs):
+                yield from call(args, kwargs)
+            generator_wrapper.local_function = function
+            return generator_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return call(args, kwargs)
+        wrapper.local_function = function
+        return wrapper
+    return decorator
@@ -0,0 +1,174 @@
+"""Local query server: loads data once and answers Controller and Optimizer queries of many clients over a Unix
+socket or localhost TCP. Requests and responses are JSON lines:
+
+    {"id": 1, "method": "get_common_effects", "args": ["Wheat", "Blue Mountain Flower"], "kwargs": {}}
+    {"id": 1, "result": ["Fortify Health", "Restore Health"]}
+
+Run with `python QueryServer.py --unix /tmp/alchemy.sock` or `--port 8765`, clients use
+QueryClient.connect_query_server. Identical queries in flight are computed once and results are kept in a cache
+shared by all clients, cleared when data is reloaded.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import Controller
+import Optimizer
+from DataHandler import DataHandler
+from LRUCache import LRUCache
+from QueryClient import to_json_value
+
+
+def _list_recipes(iter_function):
+    @functools.wraps(iter_function)
+    def list_function(*args, **kwargs):
+        return list(iter_function(*args, **kwargs))
+    return list_function
+
+
+def _get_local_function(function):
+    return getattr(function, "local_function", function)
+
+
+_METHODS_DICT = {
+    "get_common_effects": _get_local_function(Controller.get_common_effects),
+    "get_triple_effects": _get_local_function(Controller.get_triple_effects),
+    "get_recipes_with_effect": _get_local_function(Controller.get_recipes_with_effect),
+    "get_possible_effects_combinations": _get_local_function(Controller.get_possible_effects_combinations),
+    "iter_possible_recipes": _list_recipes(_get_local_function(Controller.iter_possible_recipes)),
+    "iter_recipes_for_effects": _list_recipes(_get_local_function(Controller.iter_recipes_for_effects)),
+    "plan_brews": _get_local_function(Optimizer.plan_brews),
+}
+
+
+class QueryServer:
+    """Answers queries in a worker thread, so the event loop keeps reading requests and coalescing identical ones
+    while a query runs. Queries run one at a time: they hold the GIL anyway, and the caches of Controller are not
+    shared between threads."""
+    _missing = object()
+
+    def __init__(self, cache_size=4096):
+        self._results_cache = LRUCache(max_size=cache_size)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="QueryServer")
+        self._pending_futures_dict: dict = {}
+        self.coalesced_requests_count = 0
+        self._data_generation = 0
+        self._loop = None
+        self._server = None
+        DataHandler()
+
+    async def start(self, unix_socket_path=None, host="127.0.0.1", port=8765):
+        self._loop = asyncio.get_running_loop()
+        # listeners run in the thread which reloaded data, the cache is cleared in the event loop
+        DataHandler.add_reload_listener(lambda: self._loop.call_soon_threadsafe(self._on_data_reloaded))
+        if unix_socket_path:
+            self._server = await asyncio.start_unix_server(self._handle_client, unix_socket_path, limit=2 ** 24)
+        else:
+            self._server = await asyncio.start_server(self._handle_client, host, port, limit=2 ** 24)
+        return self._server
+
+    async def serve_forever(self, unix_socket_path=None, host="127.0.0.1", port=8765):
+        server = await self.start(unix_socket_path, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def _on_data_reloaded(self):
+        self._data_generation += 1
+        self._results_cache.clear()
+
+    def get_stats(self) -> dict:
+        return {**self._results_cache.get_stats(), "coalesced_requests": self.coalesced_requests_count,
+                "pending_queries": len(self._pending_futures_dict)}
+
+    async def _handle_client(self, reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self._answer_request(line, writer, write_lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass  # client went away, its queries in flight still finish for coalesced requests and the cache
+        finally:
+            await asyncio.gather(*tasks)
+            writer.close()
+
+    async def _answer_request(self, line, writer, write_lock):
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            response = {"id": request_id, "result": await self.answer(request["method"], request.get("args", []),
+                                                                      request.get("kwargs", {}))}
+        except Exception as exception:
+            response = {"id": request_id, "error": f"{type(exception).__name__}: {exception}"}
+        async with write_lock:
+            if writer.is_closing():
+                return
+            try:
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+            except ConnectionError:
+                pass  # client disconnected while its query ran
+
+    async def answer(self, method, args, kwargs):
+        """Returns JSON result of query, from the cache, from an identical query in flight, or computed"""
+        if method == "get_stats":
+            return self.get_stats()
+        function = _METHODS_DICT.get(method)
+        if function is None:
+            raise ValueError(f"Unknown method {method}.")
+        key = json.dumps([method, args, kwargs], sort_keys=True)
+        result = self._results_cache.get(key, QueryServer._missing)
+        if result is not QueryServer._missing:
+            return result
+        pending_future = self._pending_futures_dict.get(key)
+        if pending_future is not None:
+            self.coalesced_requests_count += 1
+            return await asyncio.shield(pending_future)
+
+        pending_future = self._loop.create_future()
+        self._pending_futures_dict[key] = pending_future
+        data_generation = self._data_generation
+        try:
+            result = to_json_value(await self._loop.run_in_executor(self._executor,
+                                                                    functools.partial(function, *args, **kwargs)))
+        except Exception as exception:
+            pending_future.set_exception(exception)
+            # the exception is passed to coalesced requests, marking it retrieved avoids a warning without them
+            pending_future.exception()
+            raise
+        else:
+            # a result computed while data was reloaded may be stale, it is answered but not cached
+            if data_generation == self._data_generation:
+                self._results_cache.put(key, result)
+            pending_future.set_result(result)
+            return result
+        finally:
+            del self._pending_futures_dict[key]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serves recipe queries to local clients.")
+    parser.add_argument("--unix", help="Unix socket path to listen on instead of TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-size", type=int, default=4096)
+    parser.add_argument("--watch", action="store_true", help="reload data when data file changes")
+    args = parser.parse_args(argv)
+    query_server = QueryServer(args.cache_size)
+    if args.watch:
+        DataHandler().start_watching()
+    try:
+        asyncio.run(query_server.serve_forever(args.unix, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
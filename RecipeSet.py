@@ -0,0 +1,60 @@
+from DataHandler import DataHandler
+from Profiling import profiled
+
+
+class IncrementalRecipeSet:
+    """Recipes that can be made of owned ingredients, kept up to date one ingredient at a time. When an ingredient
+    becomes owned or runs out, only recipes containing it are added or retracted."""
+
+    def __init__(self, max_ingredients_count=3):
+        self.max_ingredients_count = max_ingredients_count
+        self.effects_to_ingredients_dict: dict = {}
+        self._snapshot = DataHandler().snapshot
+        self._ingredients_mask = 0
+
+    @profiled
+    def update_count(self, ingredient, count) -> bool:
+        """Updates recipes after count of ingredient changed. Returns True if recipes changed, which only happens
+        when count moves between 0 and non-zero."""
+        ingredient_id = self._snapshot.effect_index.ingredient_ids_dict.get(ingredient)
+        if ingredient_id is None or bool(count) == bool(self._ingredients_mask >> ingredient_id & 1):
+            return False
+        if count:
+            self._add_ingredient(ingredient_id)
+        else:
+            self._remove_ingredient(ingredient_id)
+        return True
+
+    @profiled
+    def reload_snapshot(self):
+        """Rebuilds recipes of owned ingredients from current DataHandler snapshot (ingredient ids may change)"""
+        owned_ingredients = [self._snapshot.effect_index.ingredients_list[i]
+                             for i in self._snapshot.effect_index.mask_to_ids(self._ingredients_mask)]
+        self._snapshot = DataHandler().snapshot
+        self.effects_to_ingredients_dict = {}
+        self._ingredients_mask = 0
+        for ingredient in owned_ingredients:
+            self.update_count(ingredient, 1)
+
+    def _iter_combinations_with(self, ingredient_id):
+        effect_index = self._snapshot.effect_index
+        ingredients_list = effect_index.ingredients_list
+        effects_list = effect_index.effects_list
+        for ingredient_ids, effects_mask in effect_index.iter_recipes_with(
+                ingredient_id, self._ingredients_mask, self.max_ingredients_count):
+            combination = tuple(ingredients_list[i] for i in ingredient_ids)
+            for effect_id in effect_index.mask_to_ids(effects_mask):
+                yield effects_list[effect_id], combination
+
+    def _add_ingredient(self, ingredient_id):
+        for effect, combination in self._iter_combinations_with(ingredient_id):
+            self.effects_to_ingredients_dict.setdefault(effect, set()).add(combination)
+        self._ingredients_mask |= 1 << ingredient_id
+
+    def _remove_ingredient(self, ingredient_id):
+        self._ingredients_mask &= ~(1 << ingredient_id)
+        for effect, combination in self._iter_combinations_with(ingredient_id):
+            combinations = self.effects_to_ingredients_dict[effect]
+            combinations.discard(combination)
+            if not combinations:
+                del self.effects_to_ingredients_dict[effect]
@@ -0,0 +1,85 @@
+from DataHandler import DataHandler
+from SearchIndex import fold_text
+from Translations import DEFAULT_LOCALE, get_locale_table
+from Profiling import profiled
+
+SORT_BY_INGREDIENTS = "ingredients"
+SORT_BY_EFFECTS_COUNT = "effects_count"
+
+
+def _get_text_masks(locale_table, filter_text):
+    """Returns masks of ingredients and effects whose names in locale_table contain filter_text"""
+    query = fold_text(filter_text).strip()
+    ingredients_mask = 0
+    for ingredient_id, name in enumerate(locale_table.ingredient_names):
+        if query in fold_text(name):
+            ingredients_mask |= 1 << ingredient_id
+    effects_mask = 0
+    for effect_id, name in enumerate(locale_table.effect_names):
+        if query in fold_text(name):
+            effects_mask |= 1 << effect_id
+    return ingredients_mask, effects_mask
+
+
+@profiled
+def iter_sorted_recipes(selected_ingredients_set, sort_key=SORT_BY_INGREDIENTS, descending=False, filter_text="",
+                        max_ingredients_count=3, locale=DEFAULT_LOCALE):
+    """Yields (tuple of ingredient ids, effects bitmask) of recipes made of selected ingredients, sorted and filtered
+    in the engine, so a view can take only the rows it shows. Sorting by ingredients follows their names in locale
+    and is produced one first ingredient at a time, sorting by number of effects makes one pass per count of
+    effects found in the first pass, so only the counts a view reaches are scanned and no recipes are buffered.
+    filter_text keeps recipes with an ingredient or effect whose name in locale contains it."""
+    snapshot = DataHandler().snapshot
+    effect_index = snapshot.effect_index
+    selected_mask = effect_index.get_ingredients_mask(selected_ingredients_set)
+    if filter_text.strip():
+        text_ingredients_mask, text_effects_mask = _get_text_masks(get_locale_table(locale), filter_text)
+        if not text_ingredients_mask and not text_effects_mask:
+            return
+    else:
+        text_ingredients_mask = text_effects_mask = None
+
+    def accept(ingredient_ids, effects_mask):
+        if text_ingredients_mask is None or effects_mask & text_effects_mask:
+            return True
+        return any(text_ingredients_mask >> i & 1 for i in ingredient_ids)
+
+    if sort_key == SORT_BY_EFFECTS_COUNT:
+        # every effect of a triple is shared by at least two of its three ingredients
+        max_effects_count = max((ingredient.effects_mask.bit_count() for ingredient in effect_index.ingredients),
+                                default=0)
+        if max_ingredients_count >= 3:
+            max_effects_count = 3 * max_effects_count // 2
+        effects_counts = range(max_effects_count, 0, -1) if descending else range(1, max_effects_count + 1)
+        recipes_source = snapshot.get_recipes_source(selected_mask)
+        found_effects_counts_set = None
+        for effects_count in effects_counts:
+            if found_effects_counts_set is None:
+                # first pass also finds the counts of accepted recipes, so passes for other missing counts are skipped
+                found_effects_counts_set = set()
+                for ingredient_ids, effects_mask in recipes_source.iter_recipes(selected_mask, max_ingredients_count):
+                    if accept(ingredient_ids, effects_mask):
+                        found_effects_counts_set.add(effects_mask.bit_count())
+                        if effects_mask.bit_count() == effects_count:
+                            yield ingredient_ids, effects_mask
+            elif effects_count in found_effects_counts_set:
+                for ingredient_ids, effects_mask in recipes_source.iter_recipes(selected_mask, max_ingredients_count):
+                    if effects_mask.bit_count() == effects_count and accept(ingredient_ids, effects_mask):
+                        yield ingredient_ids, effects_mask
+    elif sort_key == SORT_BY_INGREDIENTS:
+        locale_table = get_locale_table(locale)
+        ranks = locale_table.ingredient_ranks
+        first_ingredient_ids = [i for i in locale_table.ingredient_ids_by_name if selected_mask >> i & 1]
+        # other ingredients of a recipe come after its first ingredient in name order
+        later_mask = 0 if descending else selected_mask
+        for first_ingredient_id in reversed(first_ingredient_ids) if descending else first_ingredient_ids:
+            later_mask &= ~(1 << first_ingredient_id)
+            recipes = [recipe for recipe in effect_index.iter_recipes_with(first_ingredient_id, later_mask,
+                                                                           max_ingredients_count)
+                       if accept(*recipe)]
+            recipes.sort(key=lambda recipe: sorted(ranks[i] for i in recipe[0]), reverse=descending)
+            yield from recipes
+            if descending:
+                later_mask |= 1 << first_ingredient_id
+    else:
+        raise ValueError(f"Unknown sort key {sort_key}.")
@@ -0,0 +1,122 @@
+import hashlib
+import mmap
+import os
+import struct
+from EffectIndex import EffectIndex
+
+# File layout (little endian):
+#   header:   magic, version, sha256 of source json, effects count, ingredients count, recipes count,
+#             byte length of names block
+#   names:    effect names followed by ingredient names, utf-8, separated by "\n"
+#   types:    one byte per effect (index in _EFFECT_TYPES_LIST)
+#   masks:    ingredients bitmask of every effect
+#   recipes:  three ingredient ids (_NO_INGREDIENT for pairs) followed by effects bitmask
+_MAGIC = b"SKAR"
+_VERSION = 1
+_HEADER_STRUCT = struct.Struct("<4sH32sHHII")
+_NO_INGREDIENT = 0xFFFF
+_EFFECT_TYPES_LIST = ["positive", "negative"]
+
+
+def get_file_hash(file_path) -> bytes:
+    """Returns sha256 digest of file contents"""
+    with open(file_path, "rb") as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def _mask_to_words(mask: int, words_count: int) -> list:
+    return [(mask >> (64 * i)) & 0xFFFFFFFFFFFFFFFF for i in range(words_count)]
+
+
+def _words_to_mask(words) -> int:
+    mask = 0
+    for i, word in enumerate(words):
+        mask |= word << (64 * i)
+    return mask
+
+
+def build_recipe_table(json_path, table_path, alchemy_effects_to_ingredients_dict: dict,
+                       alchemy_effects_to_effect_type_dict: dict):
+    """Precomputes every valid 2- and 3-ingredient recipe and writes them to table_path, keyed by hash of json_path"""
+    effect_index = EffectIndex(alchemy_effects_to_ingredients_dict, alchemy_effects_to_effect_type_dict)
+    ingredients_words_count = max(1, (len(effect_index.ingredients_list) + 63) // 64)
+    effects_words_count = max(1, (len(effect_index.effects_list) + 63) // 64)
+    if len(effect_index.ingredients_list) >= _NO_INGREDIENT:
+        raise ValueError(f"Too many ingredients ({len(effect_index.ingredients_list)}) for recipe table.")
+
+    names = "\n".join(effect_index.effects_list + effect_index.ingredients_list).encode("utf-8")
+    recipes = list(effect_index.iter_recipes())
+    recipe_struct = struct.Struct(f"<3H{effects_words_count}Q")
+    mask_struct = struct.Struct(f"<{ingredients_words_count}Q")
+
+    tmp_path = f"{table_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER_STRUCT.pack(_MAGIC, _VERSION, get_file_hash(json_path), len(effect_index.effects_list),
+                                    len(effect_index.ingredients_list), len(recipes), len(names)))
+        f.write(names)
+        f.write(bytes(_EFFECT_TYPES_LIST.index(alchemy_effects_to_effect_type_dict[effect])
+                      for effect in effect_index.effects_list))
+        for mask in effect_index.effect_ingredients_masks_list:
+            f.write(mask_struct.pack(*_mask_to_words(mask, ingredients_words_count)))
+        for ingredient_ids, effects_mask in recipes:
+            padded_ids = ingredient_ids + (_NO_INGREDIENT,) * (3 - len(ingredient_ids))
+            f.write(recipe_struct.pack(*padded_ids, *_mask_to_words(effects_mask, effects_words_count)))
+    os.replace(tmp_path, table_path)
+
+
+class RecipeTable:
+    """Memory-mapped table of precomputed recipes created by build_recipe_table"""
+
+    def __init__(self, table_path):
+        with open(table_path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.json_hash, effects_count, ingredients_count, self.recipes_count, \
+            names_length = _HEADER_STRUCT.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"File {table_path} is not a recipe table of version {_VERSION}.")
+
+        offset = _HEADER_STRUCT.size
+        names = self._mmap[offset:offset + names_length].decode("utf-8").split("\n")
+        self.effects_list: list = names[:effects_count]
+        self.ingredients_list: list = names[effects_count:]
+        offset += names_length
+
+        self.effect_types_list: list = [_EFFECT_TYPES_LIST[i] for i in self._mmap[offset:offset + effects_count]]
+        offset += effects_count
+
+        ingredients_words_count = max(1, (ingredients_count + 63) // 64)
+        mask_struct = struct.Struct(f"<{ingredients_words_count}Q")
+        self.effect_ingredients_masks_list: list = [
+            _words_to_mask(words) for words in
+            mask_struct.iter_unpack(self._mmap[offset:offset + mask_struct.size * effects_count])]
+        offset += mask_struct.size * effects_count
+
+        self._recipe_struct = struct.Struct(f"<3H{max(1, (effects_count + 63) // 64)}Q")
+        self._recipes_view = memoryview(self._mmap)[offset:offset + self._recipe_struct.size * self.recipes_count]
+
+    def __len__(self):
+        return self.recipes_count
+
+    def get_alchemy_effects_to_ingredients_dict(self) -> dict:
+        """Returns dict effect -> list of ingredients, like the one parsed from json"""
+        return {effect: [self.ingredients_list[i] for i in EffectIndex.mask_to_ids(mask)]
+                for effect, mask in zip(self.effects_list, self.effect_ingredients_masks_list)}
+
+    def iter_recipes(self, ingredients_mask: int = None, max_ingredients_count: int = 3):
+        """Yields (tuple of ingredient ids, effects bitmask) for every stored recipe made of ingredients from
+        ingredients_mask (all ingredients if None), in the order produced by EffectIndex.iter_recipes"""
+        for i, j, k, *words in self._recipe_struct.iter_unpack(self._recipes_view):
+            if k != _NO_INGREDIENT and max_ingredients_count < 3:
+                continue
+            if ingredients_mask is not None and not (
+                    ingredients_mask >> i & ingredients_mask >> j & 1
+                    and (k == _NO_INGREDIENT or ingredients_mask >> k & 1)):
+                continue
+            effects_mask = words[0] if len(words) == 1 else _words_to_mask(words)
+            yield ((i, j) if k == _NO_INGREDIENT else (i, j, k)), effects_mask
+
+
+if __name__ == '__main__':
+    from DataHandler import DataHandler
+    DataHandler().build_recipe_table()
@@ -0,0 +1,47 @@
+import unicodedata
+from Profiling import profiled
+
+# letters which don't decompose into base letter and combining accent
+_FOLD_TABLE = str.maketrans({"ł": "l", "ø": "o", "đ": "d", "æ": "ae", "œ": "oe"})
+
+
+def fold_text(text: str) -> str:
+    """Returns lowercase text without accents, used for both indexed texts and queries"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold().translate(_FOLD_TABLE))
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+class SearchIndex:
+    """Substring search over rows described by a name and optional keywords (e.g. effect names). Texts are folded
+    once and indexed by trigrams; a query extending the previous one only narrows the previous result."""
+    _ngram_length = 3
+
+    def __init__(self, names, keywords_per_row=None):
+        keywords_per_row = keywords_per_row or [()] * len(names)
+        # keywords are separated by newline, which never occurs in a folded query, so matches don't span them
+        self._texts: list = [fold_text("\n".join((name, *keywords))) for name, keywords in zip(names, keywords_per_row)]
+        self._ngrams_dict: dict = {}
+        for row, text in enumerate(self._texts):
+            for i in range(len(text) - SearchIndex._ngram_length + 1):
+                self._ngrams_dict.setdefault(text[i:i + SearchIndex._ngram_length], set()).add(row)
+        self._last_query = ""
+        self._last_rows = None
+
+    @profiled
+    def search(self, query: str):
+        """Returns set of rows whose name or keywords contain query, or None when query is empty (all rows match)"""
+        query = fold_text(query).strip()
+        if not query:
+            rows = None
+        elif self._last_query and query.find(self._last_query) >= 0:
+            rows = {row for row in self._last_rows if query in self._texts[row]}
+        elif len(query) >= SearchIndex._ngram_length:
+            ngram_sets = sorted((self._ngrams_dict.get(query[i:i + SearchIndex._ngram_length], set())
+                                 for i in range(len(query) - SearchIndex._ngram_length + 1)), key=len)
+            candidates = ngram_sets[0].intersection(*ngram_sets[1:])
+            rows = {row for row in candidates if query in self._texts[row]}
+        else:
+            rows = {row for row, text in enumerate(self._texts) if query in text}
+        self._last_query = query
+        self._last_rows = rows
+        return rows
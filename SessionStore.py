@@ -0,0 +1,114 @@
+import itertools
+import queue
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingredient_counts (ingredient TEXT PRIMARY KEY, count INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS pins (ingredient TEXT PRIMARY KEY, sequence_number INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+class SessionStore:
+    """Ingredient counts, pins and settings kept in SQLite database in WAL mode. Every change is a small delta of
+    one row: setters only put it in a queue and a writer thread commits queued deltas in one transaction per batch,
+    so no write happens in the calling (GUI) thread and repeated changes of the same row in a batch are written
+    once. Rows are keyed by ingredient names, which stay valid when data is reloaded."""
+
+    def __init__(self, database_path, batch_interval=0.25):
+        self.database_path = database_path
+        self.batch_interval = batch_interval
+        connection = self._connect()
+        try:
+            connection.executescript(_SCHEMA)
+            self.ingredient_counts_dict: dict = dict(
+                connection.execute("SELECT ingredient, count FROM ingredient_counts"))
+            pins = connection.execute(
+                "SELECT ingredient, sequence_number FROM pins ORDER BY sequence_number").fetchall()
+            self.pinned_ingredients_list: list = [ingredient for ingredient, _ in pins]
+            self.settings_dict: dict = dict(connection.execute("SELECT key, value FROM settings"))
+        finally:
+            connection.close()
+        self._sequence_numbers = itertools.count(pins[-1][1] + 1 if pins else 0)
+        self._deltas_queue = queue.Queue()
+        self._writer_thread = threading.Thread(target=self._write, name="SessionStoreWriter", daemon=True)
+        self._writer_thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.database_path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def set_count(self, ingredient, count):
+        self._deltas_queue.put(("ingredient_counts", ingredient, count or None))
+
+    def set_counts(self, counts_dict: dict):
+        for ingredient, count in counts_dict.items():
+            self._deltas_queue.put(("ingredient_counts", ingredient, count or None))
+
+    def set_pinned(self, ingredient, pinned: bool):
+        """Records pin or unpin of ingredient, restored pins keep pinning order"""
+        self._deltas_queue.put(("pins", ingredient, next(self._sequence_numbers) if pinned else None))
+
+    def set_setting(self, key, value):
+        self._deltas_queue.put(("settings", key, value))
+
+    def get_setting(self, key, default=None):
+        """Returns setting as it was when the store was opened"""
+        return self.settings_dict.get(key, default)
+
+    def flush(self):
+        """Blocks until all changes recorded so far are committed"""
+        done_event = threading.Event()
+        self._deltas_queue.put(done_event)
+        done_event.wait()
+
+    def close(self):
+        """Commits pending changes and stops writer thread"""
+        if self._writer_thread is None:
+            return
+        self._deltas_queue.put(None)
+        self._writer_thread.join()
+        self._writer_thread = None
+
+    def _write(self):
+        connection = self._connect()
+        try:
+            while True:
+                deltas = [self._deltas_queue.get()]
+                # collects deltas of one batch interval, so a burst of clicks is one transaction
+                deadline = time.monotonic() + self.batch_interval
+                while isinstance(deltas[-1], tuple):
+                    try:
+                        deltas.append(self._deltas_queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                    except queue.Empty:
+                        break
+                self._commit(connection, deltas)
+                if isinstance(deltas[-1], threading.Event):
+                    deltas[-1].set()
+                elif deltas[-1] is None:
+                    return
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _commit(connection, deltas):
+        latest_values_dict = {}
+        for delta in deltas:
+            if isinstance(delta, tuple):
+                table, key, value = delta
+                latest_values_dict[table, key] = value
+        if not latest_values_dict:
+            return
+        key_columns_dict = {"ingredient_counts": "ingredient", "pins": "ingredient", "settings": "key"}
+        value_columns_dict = {"ingredient_counts": "count", "pins": "sequence_number", "settings": "value"}
+        with connection:
+            for (table, key), value in latest_values_dict.items():
+                if value is None and table != "settings":
+                    connection.execute(f"DELETE FROM {table} WHERE {key_columns_dict[table]} = ?", (key,))
+                else:
+                    connection.execute(f"INSERT OR REPLACE INTO {table} ({key_columns_dict[table]}, "
+                                       f"{value_columns_dict[table]}) VALUES (?, ?)", (key, value))
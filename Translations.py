@@ -0,0 +1,90 @@
+import json
+import os
+from DataHandler import DataHandler
+from EffectIndex import EffectIndex
+from SearchIndex import fold_text
+
+DEFAULT_LOCALE = "en"
+
+_locale_tables_dict = {}
+DataHandler.add_reload_listener(_locale_tables_dict.clear)
+
+
+class LocaleTable:
+    """Display names of one locale compiled for an effect index: tuples indexed by ingredient and effect ids, so
+    translating a name is one index lookup. Names missing in the catalog stay English. ingredient_ids_by_name lists
+    ingredient ids in order of their names ignoring case and accents, ingredient_ranks gives position of every id in
+    it."""
+    __slots__ = ("locale", "name", "ingredient_names", "effect_names", "ingredient_ids_by_name", "ingredient_ranks",
+                 "_ingredient_ids_dict", "_effect_ids_dict")
+
+    def __init__(self, locale, name, effect_index: EffectIndex, catalog_dict: dict):
+        ingredients_dict = catalog_dict.get("ingredients", {})
+        effects_dict = catalog_dict.get("effects", {})
+        self.locale = locale
+        self.name = name
+        self.ingredient_names: tuple = tuple(ingredients_dict.get(ingredient, ingredient)
+                                             for ingredient in effect_index.ingredients_list)
+        self.effect_names: tuple = tuple(effects_dict.get(effect, effect) for effect in effect_index.effects_list)
+        names = self.ingredient_names
+        self.ingredient_ids_by_name: tuple = tuple(sorted(range(len(names)), key=lambda i: (fold_text(names[i]),
+                                                                                            names[i])))
+        ranks = [0] * len(names)
+        for rank, ingredient_id in enumerate(self.ingredient_ids_by_name):
+            ranks[ingredient_id] = rank
+        self.ingredient_ranks: tuple = tuple(ranks)
+        self._ingredient_ids_dict = effect_index.ingredient_ids_dict
+        self._effect_ids_dict = effect_index.effect_ids_dict
+
+    def translate_ingredient(self, ingredient) -> str:
+        ingredient_id = self._ingredient_ids_dict.get(ingredient)
+        return ingredient if ingredient_id is None else self.ingredient_names[ingredient_id]
+
+    def translate_effect(self, effect) -> str:
+        effect_id = self._effect_ids_dict.get(effect)
+        return effect if effect_id is None else self.effect_names[effect_id]
+
+
+def get_locales_folder_path():
+    return f"{DataHandler._data_folder_path}/locales"
+
+
+def get_available_locales() -> dict:
+    """Returns dict locale -> name of the language, English first"""
+    locales_dict = {DEFAULT_LOCALE: "English"}
+    try:
+        file_names = sorted(os.listdir(get_locales_folder_path()))
+    except OSError:
+        return locales_dict
+    for file_name in file_names:
+        locale, extension = os.path.splitext(file_name)
+        if extension == ".json" and locale != DEFAULT_LOCALE:
+            try:
+                locales_dict[locale] = _read_catalog(locale).get("name", locale)
+            except (OSError, ValueError):
+                continue
+    return locales_dict
+
+
+def get_locale_table(locale=DEFAULT_LOCALE) -> LocaleTable:
+    """Returns display names of locale for current data. Catalog of a locale is read and compiled on first use and
+    kept until data is reloaded, so switching language back and forth only swaps tables."""
+    effect_index = DataHandler().effect_index
+    locale_table = _locale_tables_dict.get(locale)
+    if locale_table is None or locale_table._ingredient_ids_dict is not effect_index.ingredient_ids_dict:
+        catalog_dict = {} if locale == DEFAULT_LOCALE else _read_catalog(locale)
+        locale_table = LocaleTable(locale, catalog_dict.get("name", "English"), effect_index, catalog_dict)
+        _locale_tables_dict[locale] = locale_table
+    return locale_table
+
+
+def _read_catalog(locale) -> dict:
+    """Reads catalog data/locales/<locale>.json: {"name": ..., "ingredients": {English name: name}, "effects": {...}}"""
+    with open(f"{get_locales_folder_path()}/{locale}.json", "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == '__main__':
+    locale_table = get_locale_table("pl")
+    print(get_available_locales())
+    print(locale_table.ingredient_names[:10])
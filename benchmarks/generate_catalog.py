@@ -0,0 +1,69 @@
+import argparse
+import json
+import random
+
+
+def generate_catalog(ingredients_count=109, effects_count=55, effects_per_ingredient=4, skew=1.0,
+                     negative_fraction=0.4, seed=0) -> list:
+    """Returns synthetic list of effects in alchemy_effects.json schema. Effects of every ingredient are drawn
+    without repetition with probability proportional to 1 / rank ** skew, so skew 0 spreads ingredients evenly and
+    higher skew makes a few effects very common."""
+    rng = random.Random(seed)
+    effect_names = [f"Effect {i:05d}" for i in range(effects_count)]
+    weights = [1 / (rank + 1) ** skew for rank in range(effects_count)]
+    effects_to_ingredients = {name: [] for name in effect_names}
+    for i in range(ingredients_count):
+        ingredient = f"Ingredient {i:06d}"
+        chosen = set()
+        while len(chosen) < min(effects_per_ingredient, effects_count):
+            chosen.add(rng.choices(effect_names, weights)[0])
+        for effect in chosen:
+            effects_to_ingredients[effect].append(ingredient)
+
+    negative_effects = set(rng.sample(effect_names, round(effects_count * negative_fraction)))
+    return [{"name": name, "type": "negative" if name in negative_effects else "positive",
+             "ingredients": sorted(ingredients)}
+            for name, ingredients in effects_to_ingredients.items() if ingredients]
+
+
+def generate_acquisition_graph(catalog: list, locations_count=30, vendors_count=15, routes_per_location=3,
+                               sources_per_ingredient=3, seed=0) -> dict:
+    """Returns synthetic acquisition.json for catalog: random connected map of locations, vendors selling random
+    ingredients and gathering spots"""
+    rng = random.Random(seed)
+    ingredients = sorted({ingredient for effect in catalog for ingredient in effect["ingredients"]})
+    locations = [f"Location {i:04d}" for i in range(locations_count)]
+    routes = [{"from": locations[i], "to": locations[rng.randrange(i)], "time": rng.randint(1, 20)}
+              for i in range(1, locations_count)]
+    routes += [{"from": rng.choice(locations), "to": rng.choice(locations), "time": rng.randint(1, 20)}
+               for _ in range(locations_count * (routes_per_location - 1))]
+    vendors = [{"name": f"Vendor {i:04d}", "location": rng.choice(locations), "prices": {}}
+               for i in range(vendors_count)]
+    gathering_spots = {location: {} for location in locations}
+    for ingredient in ingredients:
+        for _ in range(sources_per_ingredient):
+            if rng.random() < 0.5:
+                rng.choice(vendors)["prices"][ingredient] = rng.randint(1, 100)
+            else:
+                gathering_spots[rng.choice(locations)][ingredient] = rng.randint(1, 10)
+    return {"start_location": locations[0], "routes": routes, "vendors": vendors,
+            "locations": [{"name": location, "ingredients": spot_ingredients}
+                          for location, spot_ingredients in gathering_spots.items() if spot_ingredients]}
+
+
+def write_catalog(file_path, **kwargs):
+    with open(file_path, "w", encoding="utf-8") as f:
+        json.dump(generate_catalog(**kwargs), f, indent=4)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate synthetic alchemy_effects.json catalog.")
+    parser.add_argument("output", help="path of json file to write")
+    parser.add_argument("--ingredients", type=int, default=109)
+    parser.add_argument("--effects", type=int, default=55)
+    parser.add_argument("--effects-per-ingredient", type=int, default=4)
+    parser.add_argument("--skew", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_catalog(args.output, ingredients_count=args.ingredients, effects_count=args.effects,
+                  effects_per_ingredient=args.effects_per_ingredient, skew=args.skew, seed=args.seed)
@@ -0,0 +1,191 @@
+"""Times the alchemy core on synthetic catalogs. Run from repository root:
+
+    python -m benchmarks.run_benchmarks --output results.json --compare previous_results.json
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import Controller
+import Optimizer
+from DataHandler import DataHandler
+from SearchIndex import SearchIndex
+import Acquisition
+from benchmarks.generate_catalog import generate_acquisition_graph, generate_catalog
+
+DEFAULT_CATALOGS = ["109:55:4:1.0", "300:100:4:0.5", "1000:400:4:0.3"]
+
+
+def _time(function, repeats) -> dict:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {"min_s": min(times), "median_s": statistics.median(times), "repeats": repeats}
+
+
+def _benchmark_proxy(results, repeats):
+    """Times filtering and sorting of ingredients proxy model, skipped when PySide6 is not installed"""
+    try:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PySide6.QtCore import Qt
+        from PySide6.QtWidgets import QApplication
+        from GUI.IngredientsFrame import IngredientsTableModel, IngredientsTableSortFilterProxyModel, PinRegistry
+    except ImportError:
+        return
+    app = QApplication.instance() or QApplication([])
+    effect_index = DataHandler().effect_index
+    pin_registry = PinRegistry()
+    model = IngredientsTableModel(effect_index.ingredients_list, pin_registry)
+    proxy = IngredientsTableSortFilterProxyModel(pin_registry, lambda: SearchIndex(
+        effect_index.ingredients_list,
+        [sorted(effect_index.mask_to_effects(ingredient.effects_mask)) for ingredient in effect_index.ingredients]))
+    proxy.setSourceModel(model)
+    proxy.setSortRole(Qt.DisplayRole)
+
+    def filter_keystrokes():
+        for text in ("i", "in", "ing", "ingr", ""):
+            proxy.setFilterText(text)
+
+    results["proxy_filter_keystrokes"] = _time(filter_keystrokes, repeats)
+    results["proxy_sort"] = _time(lambda: proxy.sort(0, Qt.AscendingOrder), repeats)
+    results["proxy_toggle_pin"] = _time(lambda: proxy.toggle_pin(0), repeats)
+    counts_dicts = [{name: count for name in effect_index.ingredients_list} for count in (1, 0)]
+    results["model_set_counts_all"] = _time(lambda: [model.set_counts(counts_dict) for counts_dict in counts_dicts],
+                                            repeats)
+    app.processEvents()
+
+
+def run_catalog_benchmarks(ingredients_count, effects_count, effects_per_ingredient, skew, repeats,
+                           max_ingredients_count, max_workers=1) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as data_folder_path:
+        catalog = generate_catalog(ingredients_count=ingredients_count, effects_count=effects_count,
+                                   effects_per_ingredient=effects_per_ingredient, skew=skew)
+        with open(os.path.join(data_folder_path, "alchemy_effects.json"), "w", encoding="utf-8") as f:
+            json.dump(catalog, f)
+        with open(os.path.join(data_folder_path, "acquisition.json"), "w", encoding="utf-8") as f:
+            json.dump(generate_acquisition_graph(catalog), f)
+        DataHandler.set_data_folder_path(data_folder_path)
+        data_handler = DataHandler()
+        results["data_handler_load"] = _time(data_handler.reload, repeats)
+
+        ingredients = sorted(data_handler.ingredients_set)
+        pairs = [tuple(random.Random(i).sample(ingredients, 2)) for i in range(1000)]
+
+        def common_effects_cold():
+            Controller.clear_query_cache()
+            for ingredient1, ingredient2 in pairs:
+                Controller.get_common_effects(ingredient1, ingredient2)
+
+        def common_effects_warm():
+            for ingredient1, ingredient2 in pairs:
+                Controller.get_common_effects(ingredient1, ingredient2)
+
+        results["get_common_effects_1000_cold"] = _time(common_effects_cold, repeats)
+        results["get_common_effects_1000_warm"] = _time(common_effects_warm, repeats)
+        selected = set(random.Random(0).sample(ingredients, max(2, len(ingredients) // 4)))
+        results["get_possible_effects_combinations_quarter"] = _time(
+            lambda: Controller.get_possible_effects_combinations(selected, max_ingredients_count), repeats)
+        results["get_possible_effects_combinations_all"] = _time(
+            lambda: Controller.get_possible_effects_combinations(ingredients, max_ingredients_count), repeats)
+        if max_workers > 1:
+            # first call starts worker processes
+            Controller.get_possible_effects_combinations(ingredients[:2], max_ingredients_count, max_workers)
+            results[f"get_possible_effects_combinations_all_{max_workers}_workers"] = _time(
+                lambda: Controller.get_possible_effects_combinations(ingredients, max_ingredients_count, max_workers),
+                repeats)
+            Controller.close_parallel_enumerator()
+        effects = sorted(data_handler.alchemy_effects_to_ingredients_dict)[:20]
+
+        def cheapest_recipes_cold():
+            data_handler.reload()
+            for effect in effects:
+                Acquisition.find_cheapest_recipe({effect})
+
+        results["find_cheapest_recipe_20_cold"] = _time(cheapest_recipes_cold, repeats)
+        owned_ingredients_dict = {ingredient: random.Random(i).randint(1, 5)
+                                  for i, ingredient in enumerate(ingredients)}
+
+        def plan_brews_value_cold():
+            data_handler.reload()
+            Optimizer.plan_brews(owned_ingredients_dict, Optimizer.OBJECTIVE_VALUE,
+                                 max_ingredients_count=max_ingredients_count)
+
+        results["plan_brews_value_cold"] = _time(plan_brews_value_cold, repeats)
+        for objective in (Optimizer.OBJECTIVE_POTIONS, Optimizer.OBJECTIVE_VALUE):
+            plan_brews = functools.partial(Optimizer.plan_brews, owned_ingredients_dict, objective,
+                                           max_ingredients_count=max_ingredients_count)
+            # candidates of the previous objective are cached, the first call computes these
+            plan_brews()
+            results[f"plan_brews_{objective}_warm"] = _time(plan_brews, repeats)
+        # an ingredient running out changes the set of owned ingredients
+        changed_ingredients_dict = dict(owned_ingredients_dict, **{ingredients[0]: 0})
+        results["plan_brews_value_count_change"] = _time(
+            lambda: Optimizer.plan_brews(changed_ingredients_dict, Optimizer.OBJECTIVE_VALUE,
+                                         max_ingredients_count=max_ingredients_count), repeats)
+        _benchmark_proxy(results, repeats)
+    return results
+
+
+def compare_results(results, baseline) -> list:
+    """Returns lines describing median time change of every benchmark present in both results"""
+    lines = []
+    for catalog, benchmarks in results["catalogs"].items():
+        for name, result in benchmarks.items():
+            baseline_result = baseline.get("catalogs", {}).get(catalog, {}).get(name)
+            if baseline_result:
+                ratio = result["median_s"] / baseline_result["median_s"]
+                lines.append(f"{catalog} {name}: {baseline_result['median_s']:.6f}s -> {result['median_s']:.6f}s "
+                             f"({ratio:.2f}x)")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark alchemy core on synthetic catalogs.")
+    parser.add_argument("--catalog", action="append",
+                        help="ingredients:effects:effects_per_ingredient:skew, can be repeated "
+                             f"(default {' '.join(DEFAULT_CATALOGS)})")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-ingredients-count", type=int, default=3, choices=(2, 3))
+    parser.add_argument("--max-workers", type=int, default=1,
+                        help="also time parallel enumeration with that many processes")
+    parser.add_argument("--output", help="json file to write results to, stdout if not given")
+    parser.add_argument("--compare", help="json file with previous results to compare with")
+    args = parser.parse_args(argv)
+
+    original_data_folder_path = DataHandler._data_folder_path
+    results = {"timestamp": time.time(), "python": platform.python_version(), "platform": platform.platform(),
+               "max_ingredients_count": args.max_ingredients_count, "max_workers": args.max_workers, "catalogs": {}}
+    try:
+        for catalog in args.catalog or DEFAULT_CATALOGS:
+            ingredients_count, effects_count, effects_per_ingredient, skew = catalog.split(":")
+            results["catalogs"][catalog] = run_catalog_benchmarks(
+                int(ingredients_count), int(effects_count), int(effects_per_ingredient), float(skew), args.repeats,
+                args.max_ingredients_count, args.max_workers)
+    finally:
+        DataHandler.set_data_folder_path(original_data_folder_path)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+    else:
+        json.dump(results, sys.stdout, indent=4)
+        print()
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            for line in compare_results(results, json.load(f)):
+                print(line, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
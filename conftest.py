@@ -0,0 +1 @@
+# makes root modules importable from tests
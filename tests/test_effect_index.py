@@ -0,0 +1,67 @@
+import itertools
+import random
+from DataHandler import DataHandler
+from EffectIndex import EffectIndex
+
+
+def brute_force_recipes(effect_index, ingredients_mask, max_ingredients_count=3) -> list:
+    """Returns sorted recipes of every pair and triple of ingredients from ingredients_mask, keeping pairs sharing
+    an effect and triples producing more effects than each of their pairs"""
+    masks = effect_index.ingredient_masks_list
+    ingredient_ids = effect_index.mask_to_ids(ingredients_mask)
+    recipes = [((i, j), masks[i] & masks[j]) for i, j in itertools.combinations(ingredient_ids, 2)
+               if masks[i] & masks[j]]
+    if max_ingredients_count >= 3:
+        for i, j, k in itertools.combinations(ingredient_ids, 3):
+            pair_masks = (masks[i] & masks[j], masks[i] & masks[k], masks[j] & masks[k])
+            triple_mask = pair_masks[0] | pair_masks[1] | pair_masks[2]
+            if triple_mask not in pair_masks:
+                recipes.append(((i, j, k), triple_mask))
+    return sorted(recipes)
+
+
+def get_random_masks(effect_index, count, seed=0) -> list:
+    rng = random.Random(seed)
+    ingredients_count = len(effect_index.ingredients_list)
+    return [sum(1 << i for i in range(ingredients_count) if rng.random() < fraction)
+            for fraction in (rng.uniform(0.1, 0.9) for _ in range(count))]
+
+
+def check_effect_index(effect_index, ingredients_masks, seed=0):
+    rng = random.Random(seed)
+    for ingredients_mask in ingredients_masks:
+        for max_ingredients_count in (2, 3):
+            expected = brute_force_recipes(effect_index, ingredients_mask, max_ingredients_count)
+            recipes = list(effect_index.iter_recipes(ingredients_mask, max_ingredients_count))
+            assert sorted(recipes) == expected
+            first_ingredient_ids = [ingredient_ids[0] for ingredient_ids, _ in recipes]
+            assert first_ingredient_ids == sorted(first_ingredient_ids)
+
+            ingredient_ids = effect_index.mask_to_ids(ingredients_mask)
+            for ingredient_id in rng.sample(ingredient_ids, min(3, len(ingredient_ids))):
+                assert sorted(effect_index.iter_recipes_with(ingredient_id, ingredients_mask,
+                                                             max_ingredients_count)) \
+                       == [recipe for recipe in expected if ingredient_id in recipe[0]]
+
+            effect_ids = rng.sample(range(len(effect_index.effects_list)), 2)
+            for effects_mask in (1 << effect_ids[0], 1 << effect_ids[0] | 1 << effect_ids[1]):
+                assert sorted(effect_index.iter_recipes_having(effects_mask, ingredients_mask,
+                                                               max_ingredients_count)) \
+                       == [recipe for recipe in expected if recipe[1] & effects_mask == effects_mask]
+
+
+def test_bundled_data():
+    effect_index = DataHandler().effect_index
+    all_mask = (1 << len(effect_index.ingredients_list)) - 1
+    check_effect_index(effect_index, [all_mask] + get_random_masks(effect_index, 4))
+
+
+def test_random_indexes():
+    for seed in range(5):
+        rng = random.Random(seed)
+        effects_count = rng.randint(4, 20)
+        ingredient_masks_list = [sum(1 << effect_id for effect_id in rng.sample(range(effects_count), 4))
+                                 for _ in range(rng.randint(10, 40))]
+        effect_index = EffectIndex.from_ingredient_masks(ingredient_masks_list, effects_count)
+        all_mask = (1 << len(effect_index.ingredients_list)) - 1
+        check_effect_index(effect_index, [all_mask] + get_random_masks(effect_index, 3, seed), seed)
@@ -0,0 +1,13 @@
+import os
+from InventoryImport import import_inventory
+
+EXAMPLE_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "docs", "inventory_export_example.txt")
+
+
+def test_example_export():
+    result = import_inventory(EXAMPLE_PATH)
+    assert result.counts_dict["Giant's Toe"] == 3
+    assert result.counts_dict["Nightshade"] == 4
+    # "Wheat x 12" and Polish "Pszenica x 1"
+    assert result.counts_dict["Wheat"] == 13
+    assert "Iron Ingot" in result.unmatched_names_list